@@ -0,0 +1,203 @@
+import argparse
+import asyncio
+import gc
+import json
+import platform
+import statistics
+import sys
+import time
+import timeit
+import tracemalloc
+from datetime import datetime
+
+from loguru import logger
+
+from Citlali.core.runtime import CitlaliRuntime
+from Citlali.core.type import ListenerType, DispatchMode, MessageType
+from Citlali.core.worker import Worker, listener
+from Citlali.message.entity import MessageParcel
+
+
+# 消息总线基准测试：call 往返延迟、publish 扇出吞吐、在途消息内存、Worker 数量扩展性。
+# 用法：python -m Citlali.benchmark.bus_benchmark --output bench.json
+
+class BenchWorker(Worker):
+    def __init__(self, runtime, name, sleep=0.0, on_notified=None, gate=None):
+        super().__init__(runtime, name)
+        self._sleep = sleep
+        self._on_notified = on_notified
+        self._gate = gate
+
+    @listener(ListenerType.ON_CALLED)
+    async def on_call(self, message, message_context):
+        if self._gate is not None:
+            await self._gate.wait()
+        if self._sleep:
+            await asyncio.sleep(self._sleep)
+        return message
+
+    @listener(ListenerType.ON_NOTIFIED, channel="bench_channel")
+    async def on_notify(self, message, message_context):
+        if self._sleep:
+            await asyncio.sleep(self._sleep)
+        if self._on_notified is not None:
+            self._on_notified()
+
+
+def _new_runtime(dispatch_mode, dispatcher_num):
+    runtime = CitlaliRuntime(dispatch_mode=dispatch_mode, dispatcher_num=dispatcher_num)
+    runtime.run()
+    return runtime
+
+def _percentiles(samples):
+    samples = sorted(samples)
+    def _at(q):
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+    return {
+        "count": len(samples),
+        "mean_us": statistics.fmean(samples) * 1e6,
+        "p50_us": _at(0.50) * 1e6,
+        "p90_us": _at(0.90) * 1e6,
+        "p99_us": _at(0.99) * 1e6,
+        "max_us": samples[-1] * 1e6,
+    }
+
+
+async def bench_call_latency(dispatch_mode, dispatcher_num, iterations, sleep):
+    runtime = _new_runtime(dispatch_mode, dispatcher_num)
+    runtime.register(lambda: BenchWorker(runtime, "bench_callee", sleep))
+    for _ in range(min(100, iterations)):
+        await (await runtime.call("bench_callee", 0))
+
+    samples = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        await (await runtime.call("bench_callee", i))
+        samples.append(time.perf_counter() - start)
+    return _percentiles(samples)
+
+
+async def bench_publish_fanout(dispatch_mode, dispatcher_num, subscribers, messages, sleep):
+    runtime = _new_runtime(dispatch_mode, dispatcher_num)
+    expected = subscribers * messages
+    received = 0
+    done = asyncio.Event()
+
+    def _on_notified():
+        nonlocal received
+        received += 1
+        if received == expected:
+            done.set()
+
+    for i in range(subscribers):
+        runtime.register(lambda i=i: BenchWorker(runtime, f"bench_subscriber_{i}", sleep, _on_notified))
+
+    start = time.perf_counter()
+    for i in range(messages):
+        await runtime.publish("bench_channel", i)
+    await done.wait()
+    elapsed = time.perf_counter() - start
+    return {
+        "subscribers": subscribers,
+        "messages": messages,
+        "deliveries": expected,
+        "elapsed_s": elapsed,
+        "deliveries_per_s": expected / elapsed,
+    }
+
+
+async def bench_inflight_memory(dispatch_mode, dispatcher_num, parcels):
+    # 所有调用阻塞在 gate 上，测量在途 parcel（含 future、task）平均占用内存
+    runtime = _new_runtime(dispatch_mode, dispatcher_num)
+    gate = asyncio.Event()
+    runtime.register(lambda: BenchWorker(runtime, "bench_callee", gate=gate))
+    gate.set()
+    await (await runtime.call("bench_callee", 0))
+    gate.clear()
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    futures = [await runtime.call("bench_callee", i) for i in range(parcels)]
+    await asyncio.sleep(0.1)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    gate.set()
+    await asyncio.gather(*futures)
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    return {"parcels": parcels, "bytes_total": allocated, "bytes_per_parcel": allocated / parcels}
+
+
+async def bench_worker_scaling(dispatch_mode, dispatcher_num, workers, calls, sleep):
+    runtime = _new_runtime(dispatch_mode, dispatcher_num)
+    for i in range(workers):
+        runtime.register(lambda i=i: BenchWorker(runtime, f"bench_worker_{i}", sleep))
+
+    start = time.perf_counter()
+    futures = [await runtime.call(f"bench_worker_{i % workers}", i) for i in range(calls)]
+    await asyncio.gather(*futures)
+    elapsed = time.perf_counter() - start
+    return {"workers": workers, "calls": calls, "elapsed_s": elapsed, "calls_per_s": calls / elapsed}
+
+
+def bench_parcel_construction(number):
+    per_call = timeit.timeit(lambda: MessageParcel("payload", "bench_callee", None, MessageType.REQUEST, None),
+                             number=number) / number
+    return {"number": number, "ns_per_parcel": per_call * 1e9}
+
+
+def run(args):
+    modes = [DispatchMode[mode] for mode in args.modes]
+    results = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "sleep_s": args.sleep,
+            "dispatcher_num": args.dispatchers,
+        },
+        "parcel_construction": bench_parcel_construction(args.iterations * 10),
+        "modes": {},
+    }
+    for mode in modes:
+        mode_results = {
+            "call_latency": asyncio.run(bench_call_latency(mode, args.dispatchers, args.iterations, args.sleep)),
+            "publish_fanout": [asyncio.run(bench_publish_fanout(mode, args.dispatchers, n, args.messages, args.sleep))
+                               for n in args.subscribers],
+            "inflight_memory": asyncio.run(bench_inflight_memory(mode, args.dispatchers, args.parcels)),
+            "worker_scaling": [asyncio.run(bench_worker_scaling(mode, args.dispatchers, n, args.iterations, args.sleep))
+                               for n in args.workers],
+        }
+        results["modes"][mode.name] = mode_results
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Citlali message bus benchmark")
+    parser.add_argument("--modes", nargs="+", default=[mode.name for mode in DispatchMode],
+                        choices=[mode.name for mode in DispatchMode])
+    parser.add_argument("--dispatchers", type=int, default=4, help="dispatcher coroutines in SHARDED mode")
+    parser.add_argument("--iterations", type=int, default=2000, help="calls per latency/scaling run")
+    parser.add_argument("--messages", type=int, default=500, help="publishes per fan-out run")
+    parser.add_argument("--subscribers", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--parcels", type=int, default=2000, help="in-flight parcels for the memory run")
+    parser.add_argument("--sleep", type=float, default=0.0, help="seconds each listener sleeps (0 for no-op)")
+    parser.add_argument("--output", default=None, help="write JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    results = run(args)
+    output = json.dumps(results, indent=2)
+    if args.output is None:
+        print(output)
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,24 +1,62 @@
 import functools
+import time
 from typing import List
 
 from loguru import logger
 
+from .type import MessagePriority
 from .worker import Worker
 from ..models.entity import ChatMessage
 from ..utils.image import Image
+from ..utils.json_stream import IncrementalJSONParser
 
 
 class Agent(Worker):
+    # 模型调用在 AdmissionController 中的排队优先级，交互类 Agent 可设为 HIGH，批量分析类设为 LOW
+    llm_priority = MessagePriority.NORMAL
+
     def __init__(self, runtime, name, model_client, system_messages, desc=None):
         super().__init__(runtime, name ,desc)
         self._model_client = model_client
         self._system_messages = system_messages
+        self._usage = runtime.usage
+
+    # prompt_kind 为用量统计中的提示词类别，由调用方显式给出
+    async def request_llm(self, content: str, images: List[Image] = [], *, prompt_kind: str):
+        user_message = ChatMessage(content=[content]+images, type="UserMessage", source="user")
+        start = time.perf_counter()
+        try:
+            response = await self._model_client.create(
+                self._system_messages + [user_message], priority=self.llm_priority
+            )
+        except Exception:
+            self._usage.record_error(self.name, prompt_kind)
+            raise
+        self._usage.record(self.name, prompt_kind, response, time.perf_counter() - start)
+        return self._handle_response(response)
 
-    async def request_llm(self, content: str, images: List[Image] = []):
+    async def request_llm_stream(self, content: str, images: List[Image] = [], *, prompt_kind: str):
+        # 流式请求：应答中的 JSON 对象一旦闭合就交给 on_llm_object，完整应答仍由 parse_response 解析
         user_message = ChatMessage(content=[content]+images, type="UserMessage", source="user")
-        response = await self._model_client.create(
-            self._system_messages + [user_message]
+        start = time.perf_counter()
+        stream = self._model_client.create_stream(
+            self._system_messages + [user_message], priority=self.llm_priority
         )
+        parser = IncrementalJSONParser()
+        try:
+            async for delta in stream:
+                for obj in parser.feed(delta):
+                    await self.on_llm_object(obj)
+        except Exception:
+            self._usage.record_error(self.name, prompt_kind)
+            raise
+        self._usage.record(self.name, prompt_kind, stream.result, time.perf_counter() - start)
+        return self._handle_response(stream.result)
+
+    async def on_llm_object(self, obj):
+        ...
+
+    def _handle_response(self, response):
         responses = self.parse_response(response.content)
         if isinstance(responses, tuple):
             logger.info("LLM Response: ")
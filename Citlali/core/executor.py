@@ -0,0 +1,50 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+EXECUTOR_KINDS = ("thread", "process")
+
+# 在线程池中执行的函数内为 True；Worker 的 call/publish 等协程绑定 Runtime 的事件循环，不能在其中使用
+in_executor = contextvars.ContextVar("in_executor", default=False)
+
+
+def _run_in_executor(func, *args):
+    in_executor.set(True)
+    return func(*args)
+
+
+# Runtime 管理的线程池/进程池，用于把阻塞的 listener 与同步调用移出事件循环；池在首次使用时创建
+class ListenerExecutor:
+    def __init__(self, thread_workers: int | None = None, process_workers: int | None = None):
+        self._thread_workers = thread_workers
+        self._process_workers = process_workers
+        self._thread_pool = None
+        self._process_pool = None
+
+    def _get_pool(self, kind):
+        match kind:
+            case "thread":
+                if self._thread_pool is None:
+                    self._thread_pool = ThreadPoolExecutor(self._thread_workers, thread_name_prefix="citlali-listener")
+                return self._thread_pool
+            case "process":
+                if self._process_pool is None:
+                    self._process_pool = ProcessPoolExecutor(self._process_workers)
+                return self._process_pool
+            case _:
+                raise ValueError(f"Unknown executor {kind}, expected one of {EXECUTOR_KINDS}")
+
+    async def run(self, kind, func, *args):
+        loop = asyncio.get_running_loop()
+        if kind == "thread":
+            # 线程中沿用当前上下文（如 current_message_context）；进程池中的参数与函数需可被 pickle
+            func = functools.partial(contextvars.copy_context().run, _run_in_executor, func)
+        return await loop.run_in_executor(self._get_pool(kind), func, *args)
+
+    def shutdown(self, wait: bool = False):
+        for pool in (self._thread_pool, self._process_pool):
+            if pool is not None:
+                pool.shutdown(wait=wait, cancel_futures=True)
+        self._thread_pool = None
+        self._process_pool = None
@@ -0,0 +1,166 @@
+import cProfile
+import json
+import time
+
+from loguru import logger
+
+# 直方图桶上界（毫秒），最后一个桶收集所有更慢的调用
+HISTOGRAM_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000, float("inf"))
+
+
+class ListenerStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.blocked = 0  # 单步占用事件循环超过阈值的次数
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.max_step = 0.0
+        self.wall_histogram = [0] * len(HISTOGRAM_BUCKETS_MS)
+        self.cpu_histogram = [0] * len(HISTOGRAM_BUCKETS_MS)
+
+    @staticmethod
+    def _observe(histogram, seconds):
+        for i, bound in enumerate(HISTOGRAM_BUCKETS_MS):
+            if seconds * 1000 <= bound:
+                histogram[i] += 1
+                return
+
+    def add(self, wall, cpu, max_step, blocked, error):
+        self.calls += 1
+        self.errors += error
+        self.blocked += blocked
+        self.wall_time += wall
+        self.cpu_time += cpu
+        self.max_step = max(self.max_step, max_step)
+        self._observe(self.wall_histogram, wall)
+        self._observe(self.cpu_histogram, cpu)
+
+    def to_dict(self):
+        buckets = [str(bound) for bound in HISTOGRAM_BUCKETS_MS]
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "blocked": self.blocked,
+            "avg_wall_ms": self.wall_time / self.calls * 1000 if self.calls else 0.0,
+            "avg_cpu_ms": self.cpu_time / self.calls * 1000 if self.calls else 0.0,
+            "max_loop_hold_ms": self.max_step * 1000,
+            "wall_histogram_ms": dict(zip(buckets, self.wall_histogram)),
+            "cpu_histogram_ms": dict(zip(buckets, self.cpu_histogram)),
+        }
+
+
+class _Capture:
+    def __init__(self, path, calls):
+        self.path = path
+        self.remaining = calls
+        self.profile = cProfile.Profile()
+
+
+# 逐步驱动 listener 协程：每次 send/throw 之间即 listener 独占事件循环的一段，
+# 累加得到 CPU 时间，并据此判断是否阻塞事件循环
+class _ProfiledCoroutine:
+    def __init__(self, coroutine, capture: _Capture | None):
+        self._coroutine = coroutine
+        self._capture = capture
+        self.cpu_time = 0.0
+        self.max_step = 0.0
+        self.blocked_steps = 0
+
+    def _step(self, value, error, block_threshold):
+        wall_start, cpu_start = time.perf_counter(), time.thread_time()
+        if self._capture is not None:
+            self._capture.profile.enable()
+        try:
+            if error is not None:
+                return self._coroutine.throw(error)
+            return self._coroutine.send(value)
+        finally:
+            if self._capture is not None:
+                self._capture.profile.disable()
+            self.cpu_time += time.thread_time() - cpu_start
+            step = time.perf_counter() - wall_start
+            self.max_step = max(self.max_step, step)
+            self.blocked_steps += step > block_threshold
+
+    def run(self, block_threshold):
+        value, error = None, None
+        while True:
+            try:
+                yielded = self._step(value, error, block_threshold)
+            except StopIteration as e:
+                return e.value
+            try:
+                value, error = (yield yielded), None
+            except BaseException as e:
+                value, error = None, e
+
+
+class _Awaitable:
+    def __init__(self, generator):
+        self._generator = generator
+
+    def __await__(self):
+        return (yield from self._generator)
+
+
+# 可选的 listener 级性能分析：调用次数、耗时/CPU 直方图、事件循环阻塞检测，以及对指定 listener 的 cProfile 采集。
+# 默认关闭，由 CitlaliRuntime.enable_profiling 开启
+class ListenerProfiler:
+    def __init__(self):
+        self.enabled = False
+        self._block_threshold = 0.1
+        self._stats: dict[str, ListenerStats] = dict()
+        self._captures: dict[str, _Capture] = dict()
+        self._skipped: set[str] = set()
+
+    def enable(self, block_threshold: float = 0.1):
+        self.enabled = True
+        self._block_threshold = block_threshold
+
+    def capture(self, listener_name, path, calls: int = 10):
+        # 对 "WorkerClass.method" 的后续 calls 次调用采集 cProfile，完成后写入 path（pstats 格式）
+        self._captures[listener_name] = _Capture(path, calls)
+
+    def skip(self, listener_name, executor):
+        # 在执行池中运行的 listener 不经过协程包装，不计入统计，每个 listener 只提示一次
+        if listener_name not in self._skipped:
+            self._skipped.add(listener_name)
+            logger.info("Listener {} runs in the {} executor and is excluded from profiling", listener_name, executor)
+
+    async def profile(self, worker, _listener, message, message_context):
+        listener_name = _listener.__qualname__
+        result = _listener(worker, message, message_context)
+        if not hasattr(result, "__await__"):
+            # 异步生成器等非协程结果不在此计时
+            return result
+
+        capture = self._captures.get(listener_name)
+        profiled = _ProfiledCoroutine(result.__await__(), capture)
+        wall_start = time.perf_counter()
+        error = False
+        try:
+            return await _Awaitable(profiled.run(self._block_threshold))
+        except BaseException:
+            error = True
+            raise
+        finally:
+            if profiled.blocked_steps:
+                logger.warning("Listener {} of {} held the event loop for {:.1f} ms",
+                               listener_name, worker.name, profiled.max_step * 1000)
+            self._stats.setdefault(listener_name, ListenerStats()).add(
+                time.perf_counter() - wall_start, profiled.cpu_time, profiled.max_step, profiled.blocked_steps > 0, error)
+            if capture is not None:
+                capture.remaining -= 1
+                if capture.remaining <= 0:
+                    self._captures.pop(listener_name, None)
+                    capture.profile.dump_stats(capture.path)
+
+    def stats(self):
+        return {listener_name: stats.to_dict() for listener_name, stats in self._stats.items()}
+
+    def dump(self, path):
+        for listener_name, capture in list(self._captures.items()):
+            capture.profile.dump_stats(capture.path)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.stats(), f, indent=2)
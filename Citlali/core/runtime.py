@@ -1,37 +1,168 @@
+import asyncio
+
+from loguru import logger
+
+from .executor import ListenerExecutor
+from .profiler import ListenerProfiler
 from .worker_keeper import WorkerKeeper
-from ..core.type import MessageType
+from .worker_pool import WorkerPool
+from ..core.type import MessageType, DispatchMode, OverflowPolicy, MessagePriority, RoutingStrategy, DeliveryPolicy
+from ..message.message_log import MessageLog
 from ..message.message_manager import MessageManager
+from ..message.stream import ReplyStream
+from ..message.trace import MessageTracer
+from ..models.usage import UsageRegistry
+from ..transport.broker import BrokerClient
+from ..transport.process import ProcessWorkerHost
 
 
+# 每个 Runtime 拥有独立的 WorkerKeeper、ChannelKeeper 与消息队列，同一进程内可并行运行多个互不干扰的会话；
+# get_instance() 返回进程级的默认 Runtime
 class CitlaliRuntime:
-    def __init__(self):
+    _default = None
+
+    def __init__(self, dispatch_mode: DispatchMode = DispatchMode.SINGLE, dispatcher_num: int = 1,
+                 ipc_codec: str = "pickle", priority_aging: float = 1.0, thread_workers: int | None = None,
+                 process_workers: int | None = None, notify_timeout: float | None = None,
+                 usage: UsageRegistry | None = None):
         super().__init__()
         self.workers = WorkerKeeper()
-        self.message_manager = MessageManager(self.workers)
+        self.message_manager = MessageManager(self.workers, dispatch_mode, dispatcher_num, priority_aging,
+                                              notify_timeout)
+        self._ipc_codec = ipc_codec
+        self._process_host = None
+        self._broker_client = None
+        self._message_log = None
+        self._tracer = None
+        self.executor = ListenerExecutor(thread_workers, process_workers)
+        self.profiler = ListenerProfiler()
+        self._profile_path = None
+        # 多个 Runtime 可共享同一 UsageRegistry，以便跨会话汇总模型用量
+        self.usage = usage if usage is not None else UsageRegistry()
+        self._usage_path = None
 
-    # Singleton pattern
-    def __new__(cls, *args, **kwargs):
-        if not hasattr(CitlaliRuntime, "_instance"):
-            CitlaliRuntime._instance = object.__new__(cls)
-        return CitlaliRuntime._instance
-
-    def get_instance(*args, **kwargs):
-        if not hasattr(CitlaliRuntime, '_instance'):
-            return CitlaliRuntime(*args, **kwargs)
-        return CitlaliRuntime._instance
+    @classmethod
+    def get_instance(cls, *args, **kwargs):
+        if cls._default is None:
+            cls._default = cls(*args, **kwargs)
+        return cls._default
 
     def run(self):
         self.message_manager.start_listen()
 
-    async def stop(self):
-        await self.message_manager.stop_listen_when_idle()
+    async def stop(self, timeout: float | None = None):
+        # 等待所有消息与 listener 任务完成后再释放资源，timeout 为排空的最长等待时间
+        drained = await self.message_manager.stop_listen_when_idle(timeout)
+        if self._process_host is not None:
+            await self._process_host.stop()
+        if self._broker_client is not None:
+            await self._broker_client.close()
+        if self._message_log is not None:
+            self._message_log.close()
+        if self._tracer is not None:
+            self._tracer.close()
+        if self._profile_path is not None:
+            self.profiler.dump(self._profile_path)
+        if self._usage_path is not None:
+            self.usage.stop_dump()
+            self.usage.dump(self._usage_path)
+        self.executor.shutdown()
+        return drained
+
+    def is_idle(self):
+        return self.message_manager.is_idle()
 
-    def register(self, worker):
+    async def wait_until_idle(self):
+        await self.message_manager.wait_until_idle()
+
+    def register(self, worker, mailbox_size: int = 0, max_in_flight: int | None = None,
+                 overflow_policy: OverflowPolicy = OverflowPolicy.BLOCK):
+        # 有界信箱与并发上限，仅在 DispatchMode.SHARDED 下生效；先行校验，避免失败时 Worker 已被注册
+        if mailbox_size or max_in_flight is not None:
+            self.message_manager.check_mailbox_limit()
         worker_instance=self.workers.register(worker)
+        if mailbox_size or max_in_flight is not None:
+            self.message_manager.set_mailbox_limit(worker_instance.name, mailbox_size, max_in_flight, overflow_policy)
         self.message_manager.subscribe(worker_instance.name, worker_instance.get_notify_channel())
+        if self._broker_client is not None and not self._broker_client.owns(worker_instance):
+            self._broker_client.announce(worker_instance)
+        return worker_instance
+
+    def register_pool(self, worker, replicas: int, strategy: RoutingStrategy = RoutingStrategy.ROUND_ROBIN,
+                      key=None, **kwargs):
+        # 以同一逻辑名注册 replicas 个副本，调用方无需改动；key(message) 为一致性哈希使用的消息键
+        instances = [worker() for _ in range(replicas)]
+        pool = WorkerPool(instances[0].name, instances, strategy, key)
+        return self.register(lambda: pool, **kwargs)
+
+    def set_channel_policy(self, channel, policy: DeliveryPolicy, window: float = 0.1, batch_size: int = 10):
+        # 高频频道的整形策略，channel 可为通配模式；BATCH 策略下订阅者收到的是消息列表
+        self.message_manager.set_channel_policy(channel, policy, window, batch_size)
+
+    def channel_stats(self):
+        return self.message_manager.channel_stats()
+
+    async def register_process(self, worker_factory, *args, **kwargs):
+        # 在子进程中运行 Worker：worker_factory(runtime, *args, **kwargs) 需为可 pickle 的顶层类或函数
+        if self._process_host is None:
+            self._process_host = ProcessWorkerHost(self, self._ipc_codec)
+        remote_worker = await self._process_host.spawn(worker_factory, *args, **kwargs)
+        return self.register(lambda: remote_worker)
+
+    def enable_message_log(self, directory, segment_size: int = 64 * 1024 * 1024, fsync_interval: float = 0.05):
+        # 开启持久化消息日志，需在注册 Worker 之后调用 recover() 重放上次未完成的消息
+        self._message_log = MessageLog(directory, segment_size, fsync_interval)
+        self.message_manager.set_message_log(self._message_log)
+
+    def enable_tracing(self, path, format: str = "jsonl", batch_size: int = 256):
+        # 记录每次投递的链路 span，format 为 "jsonl" 或 "otlp"；用 python -m Citlali.message.trace 查看关键路径
+        self._tracer = MessageTracer(path, format, batch_size)
+        self.message_manager.set_tracer(self._tracer)
+
+    def enable_profiling(self, block_threshold: float = 0.1, dump_path=None):
+        # 统计各 listener 的调用次数与耗时，单步占用事件循环超过 block_threshold 秒时告警；
+        # 运行中可通过 profiler.stats() 查询，dump_path 不为空时在 stop() 时写出 JSON
+        self.profiler.enable(block_threshold)
+        self._profile_path = dump_path
+
+    def enable_usage_dump(self, path, interval: float = 60.0):
+        # 每 interval 秒把模型用量统计写入 path，stop() 时再写出最终结果；运行中可通过 usage.query() 查询
+        self._usage_path = path
+        self.usage.start_dump(path, interval)
+
+    async def recover(self):
+        if self._message_log is None:
+            logger.warning("recover() called without enable_message_log(), nothing to replay")
+            return 0
+        pending = self._message_log.pending()
+        for record in pending:
+            # 原调用方已不存在，重放的 REQUEST 不再沿用 deadline；应答不等待，仅记录失败
+            future = await self.message_manager.put_message(record["message"], record["recipient"], record["sender"],
+                                                            MessageType(record["type"]),
+                                                            priority=MessagePriority(record["priority"]))
+            if future is not None:
+                future.add_done_callback(lambda f, r=record: self._on_replayed(r, f))
+            self._message_log.ack(record["mid"])
+        return len(pending)
+
+    @staticmethod
+    def _on_replayed(record, future: asyncio.Future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.error("Replayed request {} to {} failed: {!r}", record["mid"], record["recipient"], future.exception())
+
+    async def connect(self, address: str, token: str | None = None):
+        # 接入 Broker（tcp://host:port 或 unix:///path），与其他节点上的 Runtime 共享 Worker
+        self._broker_client = BrokerClient(self, address, self._ipc_codec, token)
+        await self._broker_client.connect()
+
+    async def call(self, worker_name, message, timeout: float | None = None, priority: MessagePriority | None = None):
+        return await self.message_manager.put_message(message, worker_name, None, MessageType.REQUEST, timeout, priority)
 
-    async def call(self, worker_name, message):
-        return await self.message_manager.put_message(message, worker_name, None, MessageType.REQUEST)
+    async def call_stream(self, worker_name, message, timeout: float | None = None,
+                          priority: MessagePriority | None = None, buffer: int = 16) -> ReplyStream:
+        reply = await (await self.message_manager.put_message(message, worker_name, None, MessageType.REQUEST, timeout,
+                                                              priority, buffer))
+        return reply if isinstance(reply, ReplyStream) else ReplyStream.of(reply)
 
-    async def publish(self, channel, message):
-        await self.message_manager.put_message(message, channel, None, MessageType.NOTIFICATION)
\ No newline at end of file
+    async def publish(self, channel, message, priority: MessagePriority | None = None):
+        await self.message_manager.put_message(message, channel, None, MessageType.NOTIFICATION, priority=priority)
\ No newline at end of file
@@ -8,4 +8,27 @@ class ListenerType(Enum):
 class MessageType(Enum):
     REQUEST = 1
     RESPONSE = 2
-    NOTIFICATION = 3
\ No newline at end of file
+    NOTIFICATION = 3
+
+class DispatchMode(Enum):
+    SINGLE = 1
+    SHARDED = 2
+
+class OverflowPolicy(Enum):
+    BLOCK = 1
+    REJECT = 2
+
+class MessagePriority(Enum):
+    HIGH = 0
+    NORMAL = 1
+    LOW = 2
+
+class RoutingStrategy(Enum):
+    ROUND_ROBIN = 1
+    LEAST_IN_FLIGHT = 2
+    CONSISTENT_HASH = 3
+
+class DeliveryPolicy(Enum):
+    LATEST = 1  # 尚未分发的通知被新通知覆盖
+    DEBOUNCE = 2  # 频道静默 window 秒后只投递最后一条
+    BATCH = 3  # 攒够 batch_size 条或距第一条超过 window 秒后，以列表投递
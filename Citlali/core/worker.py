@@ -1,12 +1,26 @@
+import inspect
 from collections.abc import Callable
 from typing import cast, runtime_checkable, Protocol
 
 from .runtime import CitlaliRuntime
-from .type import ListenerType, MessageType
+from .executor import EXECUTOR_KINDS, in_executor
+from .type import ListenerType, MessageType, MessagePriority
+from ..message.stream import ReplyStream
+from ..message.topic import is_pattern, topic_matches
 
 
-def listener(listener_type, listen_filter=None, channel=None):
+def listener(listener_type, listen_filter=None, channel=None, match=None, executor=None):
+    # match: 声明式匹配字段，如 {"event": EventType.Plan, "status": EventStatus.CREATED}，
+    # 编译进分发索引后按字典查找；listen_filter 作为任意条件的兜底
+    # executor: "thread" | "process"，在 Runtime 的线程池/进程池中执行同步 listener，结果照常返回；
+    # 进程池中 listener 收到的 worker 参数为 None，消息与返回值需可被 pickle；
+    # 线程池中的 listener 不能使用 call/publish 等异步接口（会抛出 RuntimeError），结果通过返回值交回，且不参与 profiling
     def decorator(func):
+        if executor is not None:
+            if executor not in EXECUTOR_KINDS:
+                raise ValueError(f"Unknown executor {executor}, expected one of {EXECUTOR_KINDS}")
+            if inspect.iscoroutinefunction(func) or inspect.isasyncgenfunction(func):
+                raise ValueError("Listener running in an executor must be a plain function")
         _listener = cast(WorkerListener, func)
         _listener.listener_type = listener_type
         if listener_type == ListenerType.ON_NOTIFIED and channel is None:
@@ -14,15 +28,82 @@ def listener(listener_type, listen_filter=None, channel=None):
         else:
             _listener.channel = channel
         _listener.listen_filter = listen_filter
+        _listener.match = dict(match) if match is not None else None
+        _listener.executor = executor
         return _listener
     return decorator
 
+class ListenerIndex:
+    def __init__(self):
+        self._indexed = dict()  # 匹配字段名 -> {字段取值: [(order, listener)]}
+        self._fallback = []  # 仅有 listen_filter 或无条件的 listener: [(order, listener)]
+
+    def add(self, order, listener):
+        if listener.match:
+            fields = tuple(sorted(listener.match))
+            values = tuple(listener.match[field] for field in fields)
+            self._indexed.setdefault(fields, dict()).setdefault(values, []).append((order, listener))
+        else:
+            self._fallback.append((order, listener))
+
+    def lookup(self, message):
+        # 与线性扫描语义一致：返回声明顺序上第一个匹配的 listener
+        found = None
+        for fields, table in self._indexed.items():
+            try:
+                candidates = table.get(tuple(getattr(message, field) for field in fields))
+            except (AttributeError, TypeError):
+                continue
+            found = self._first_match(candidates or [], message, found)
+        found = self._first_match(self._fallback, message, found)
+        return found[1] if found is not None else None
+
+    @staticmethod
+    def _first_match(candidates, message, found):
+        for order, listener in candidates:
+            if found is not None and order > found[0]:
+                break
+            if listener.listen_filter is None or listener.listen_filter(message):
+                return order, listener
+        return found
+
 class Worker():
     def __init__(self, runtime: CitlaliRuntime, name, desc=None):
         self.name = name
         self.desc = desc
         self._message_manager = runtime.message_manager
-        self._listeners = self._discover_listeners()
+        self._executor = runtime.executor
+        self._profiler = runtime.profiler
+        self._listeners, self._listener_index = self._compile_listeners()
+
+    @classmethod
+    def _compile_listeners(cls):
+        # 每个类只编译一次，按 (listener_type, channel) 建立分发索引
+        if "_compiled_listeners" not in cls.__dict__:
+            listeners = cls._discover_listeners()
+            listener_index = dict()
+            for listener_type, listener_list in listeners.items():
+                for order, _listener in enumerate(listener_list):
+                    channel = _listener.channel if listener_type == ListenerType.ON_NOTIFIED else None
+                    if (listener_type, channel) not in listener_index:
+                        listener_index[(listener_type, channel)] = ListenerIndex()
+                    listener_index[(listener_type, channel)].add(order, _listener)
+            cls._compiled_listeners = (listeners, listener_index)
+            cls._channel_indexes = dict()
+        return cls._compiled_listeners
+
+    @classmethod
+    def _get_channel_indexes(cls, channel):
+        # 具体频道对应的 ListenerIndex：精确订阅优先，其次按声明顺序匹配通配订阅，结果按类缓存
+        if channel not in cls._channel_indexes:
+            listener_index = cls._compiled_listeners[1]
+            indexes = [listener_index[(ListenerType.ON_NOTIFIED, channel)]] \
+                if (ListenerType.ON_NOTIFIED, channel) in listener_index else []
+            indexes += [index for (listener_type, pattern), index in listener_index.items()
+                        if listener_type == ListenerType.ON_NOTIFIED and pattern != channel
+                        and is_pattern(pattern) and topic_matches(pattern, channel)]
+            cls._channel_indexes[channel] = indexes
+        return cls._channel_indexes[channel]
 
     @classmethod
     def _discover_listeners(cls):
@@ -43,26 +124,59 @@ class Worker():
         return channel
 
     async def listen(self, listener_type, message, message_context, channel=None):
-        match listener_type:
-            case ListenerType.ON_CALLED:
-                for listener in self._listeners[listener_type]:
-                    if listener.listen_filter is None or listener.listen_filter(message):
-                        return await listener(self, message, message_context)
-            case ListenerType.ON_NOTIFIED:
-                for listener in self._listeners[listener_type]:
-                    if listener.channel == channel and (listener.listen_filter is None or listener.listen_filter(message)):
-                        return await listener(self, message, message_context)
-
-    async def call(self, worker_name, message):
-        return await self._message_manager.put_message(message, worker_name, self.name, MessageType.REQUEST)
-
-    async def publish(self, channel, message):
-        await self._message_manager.put_message(message, channel, self.name, MessageType.NOTIFICATION)
+        if listener_type == ListenerType.ON_NOTIFIED:
+            listener_indexes = self._get_channel_indexes(channel)
+        else:
+            listener_indexes = [self._listener_index[(listener_type, None)]] \
+                if (listener_type, None) in self._listener_index else []
+        for listener_index in listener_indexes:
+            _listener = listener_index.lookup(message)
+            if _listener is not None:
+                if _listener.executor is not None:
+                    if self._profiler.enabled:
+                        self._profiler.skip(_listener.__qualname__, _listener.executor)
+                    worker = self if _listener.executor == "thread" else None
+                    return await self._executor.run(_listener.executor, _listener, worker, message, message_context)
+                if self._profiler.enabled:
+                    return await self._profiler.profile(self, _listener, message, message_context)
+                # 异步生成器 listener 直接返回生成器，由 MessageManager 以流式应答转发
+                result = _listener(self, message, message_context)
+                return await result if inspect.isawaitable(result) else result
+
+    @staticmethod
+    def _check_loop():
+        if in_executor.get():
+            raise RuntimeError("Worker messaging APIs cannot be used inside an executor listener")
+
+    async def call(self, worker_name, message, timeout: float | None = None, priority: MessagePriority | None = None):
+        self._check_loop()
+        return await self._message_manager.put_message(message, worker_name, self.name, MessageType.REQUEST, timeout,
+                                                       priority)
+
+    async def run_blocking(self, func, *args, executor: str = "thread"):
+        # 在 listener 内部把阻塞调用（数据库驱动、图片编解码等）交给 Runtime 的执行池
+        self._check_loop()
+        return await self._executor.run(executor, func, *args)
+
+    async def call_stream(self, worker_name, message, timeout: float | None = None,
+                          priority: MessagePriority | None = None, buffer: int = 16) -> ReplyStream:
+        # 用法：async for item in await self.call_stream(...)；非流式 listener 的结果作为单元素流返回
+        self._check_loop()
+        reply = await (await self._message_manager.put_message(message, worker_name, self.name, MessageType.REQUEST,
+                                                               timeout, priority, buffer))
+        return reply if isinstance(reply, ReplyStream) else ReplyStream.of(reply)
+
+    async def publish(self, channel, message, priority: MessagePriority | None = None):
+        self._check_loop()
+        await self._message_manager.put_message(message, channel, self.name, MessageType.NOTIFICATION,
+                                                priority=priority)
 
 @runtime_checkable
 class WorkerListener(Protocol):
     listener_type: ListenerType
     listen_filter: Callable
+    match: dict | None
+    executor: str | None
     channel: str
 
     @staticmethod
@@ -9,6 +9,15 @@ class WorkerKeeper:
         self._workers[worker_instance.name] = worker_instance
         return worker_instance
 
+    def unregister(self, worker_name):
+        return self._workers.pop(worker_name, None)
+
+    def list_workers(self):
+        return list(self._workers.values())
+
+    def has_worker(self, worker_name):
+        return worker_name in self._workers
+
     def get_worker(self, worker_name):
         if worker_name in self._workers:
             return self._workers[worker_name]
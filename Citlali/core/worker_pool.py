@@ -0,0 +1,83 @@
+import bisect
+import hashlib
+import time
+
+from .type import RoutingStrategy
+
+
+class ReplicaStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.total_time = 0.0
+
+    def to_dict(self):
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "avg_ms": self.total_time / self.calls * 1000 if self.calls else 0.0,
+        }
+
+
+# 同一逻辑名下的多个 Worker 副本，注册到 WorkerKeeper 后对 MessageManager 透明；
+# call 与 notify 均按路由策略投递给其中一个副本
+class WorkerPool:
+    def __init__(self, name, replicas: list, strategy: RoutingStrategy = RoutingStrategy.ROUND_ROBIN,
+                 key=None, virtual_nodes: int = 64):
+        if not replicas:
+            raise ValueError("WorkerPool requires at least one replica")
+        if strategy is RoutingStrategy.CONSISTENT_HASH and key is None:
+            raise ValueError("RoutingStrategy.CONSISTENT_HASH requires a key function")
+        self.name = name
+        self.replicas = replicas
+        self._strategy = strategy
+        self._key = key
+        self._stats = [ReplicaStats() for _ in replicas]
+        self._next = 0
+
+        # 一致性哈希环：每个副本映射 virtual_nodes 个虚拟节点
+        self._ring = sorted((self._hash(f"{index}#{v}"), index)
+                            for index in range(len(replicas)) for v in range(virtual_nodes))
+        self._ring_keys = [h for h, _ in self._ring]
+
+    @staticmethod
+    def _hash(value):
+        return int.from_bytes(hashlib.md5(str(value).encode()).digest()[:8], "big")
+
+    def get_notify_channel(self):
+        channels = set()
+        for replica in self.replicas:
+            channels |= set(replica.get_notify_channel())
+        return channels
+
+    def _route(self, message):
+        match self._strategy:
+            case RoutingStrategy.ROUND_ROBIN:
+                index = self._next
+                self._next = (self._next + 1) % len(self.replicas)
+                return index
+            case RoutingStrategy.LEAST_IN_FLIGHT:
+                return min(range(len(self.replicas)), key=lambda i: (self._stats[i].in_flight, self._stats[i].calls))
+            case RoutingStrategy.CONSISTENT_HASH:
+                position = bisect.bisect(self._ring_keys, self._hash(self._key(message))) % len(self._ring)
+                return self._ring[position][1]
+
+    async def listen(self, listener_type, message, message_context, channel=None):
+        index = self._route(message)
+        stats = self._stats[index]
+        stats.in_flight += 1
+        start = time.perf_counter()
+        try:
+            return await self.replicas[index].listen(listener_type, message, message_context, channel)
+        except Exception:
+            stats.errors += 1
+            raise
+        finally:
+            stats.in_flight -= 1
+            stats.calls += 1
+            stats.total_time += time.perf_counter() - start
+
+    def stats(self):
+        return [{"replica": index, **stats.to_dict()} for index, stats in enumerate(self._stats)]
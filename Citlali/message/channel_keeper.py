@@ -5,40 +5,66 @@ from loguru import logger
 from ..core.worker_keeper import WorkerKeeper
 from ..core.type import ListenerType
 from .entity import MessageParcel
+from .topic import ChannelTrie
 
 
 class ChannelKeeper:
-    def __init__(self, worker_keeper: WorkerKeeper):
-        self._channels = dict()
+    def __init__(self, worker_keeper: WorkerKeeper, notify_timeout: float | None = None):
+        self._channels = dict()  # 订阅的频道或通配模式 -> [worker_name]
+        self._trie = ChannelTrie()
+        # 按具体频道缓存匹配结果与解析出的 Worker 实例，订阅关系变化时清空
+        self._channel_workers: dict[str, list] = dict()
+        self._subscribers: dict[str, tuple] = dict()
         self._worker_keeper = worker_keeper
+        self._notify_timeout = notify_timeout
 
     def subscribe(self, worker_name, channels):
         for channel in channels:
             if channel not in self._channels:
                 self._channels[channel] = []
             self._channels[channel].append(worker_name)
+            self._trie.add(channel, worker_name)
+        self._invalidate()
+
+    def unsubscribe(self, worker_name):
+        for channel, worker_list in self._channels.items():
+            if worker_name in worker_list:
+                worker_list.remove(worker_name)
+                self._trie.remove(channel, worker_name)
+        self._invalidate()
+
+    def _invalidate(self):
+        self._channel_workers.clear()
+        self._subscribers.clear()
 
     def get_in_channel_workers(self, channel):
-        if channel in self._channels:
-            return self._channels[channel]
+        if channel not in self._channel_workers:
+            self._channel_workers[channel] = self._trie.match(channel)
+        if self._channel_workers[channel]:
+            return self._channel_workers[channel]
         else:
-            logger.error(f"Channel {channel} not found")
+            # 每个事件一个频道，无订阅者的发布属于正常情况
+            logger.debug("Channel {} has no subscribers", channel)
             return None
 
-    def _build_publish_task(self, message, message_content, channel):
-        async def _publish_task(worker):
-            return await worker.listen(ListenerType.ON_NOTIFIED, message, message_content, channel)
-        return _publish_task
+    def get_subscribers(self, channel):
+        if channel not in self._subscribers:
+            workers = (self._worker_keeper.get_worker(worker_name)
+                       for worker_name in self.get_in_channel_workers(channel) or [])
+            self._subscribers[channel] = tuple(worker for worker in workers if worker is not None)
+        return self._subscribers[channel]
+
+    async def notify(self, worker, message_parcel: MessageParcel):
+        # 单个订阅者的投递：超时与异常只记录日志，不影响同一消息的其他订阅者
+        try:
+            await asyncio.wait_for(worker.listen(ListenerType.ON_NOTIFIED, message_parcel.message,
+                                                 message_parcel.message_context, message_parcel.recipient),
+                                   self._notify_timeout)
+        except TimeoutError:
+            logger.warning("Worker {} timed out handling notification on {}", worker.name, message_parcel.recipient)
+        except Exception:
+            logger.exception("Worker {} failed to handle {}", worker.name, message_parcel)
 
     async def publish(self, message_parcel: MessageParcel):
-        worker_list = self.get_in_channel_workers(message_parcel.recipient)
-        publish_task_list = []
-        if worker_list is not None:
-            for worker_name in worker_list:
-                worker = self._worker_keeper.get_worker(worker_name)
-                if worker is not None:
-                    publish_task_list.append(self._build_publish_task(
-                        message_parcel.message,
-                        message_parcel.message_context,
-                        message_parcel.recipient)(worker))
-            await asyncio.gather(*publish_task_list)
\ No newline at end of file
+        subscribers = self.get_subscribers(message_parcel.recipient)
+        await asyncio.gather(*(self.notify(worker, message_parcel) for worker in subscribers))
@@ -0,0 +1,84 @@
+import asyncio
+
+from ..core.type import DeliveryPolicy
+
+
+class _Pending:
+    __slots__ = ("messages", "sender", "priority", "last", "task")
+
+    def __init__(self, sender, priority):
+        self.messages = []
+        self.sender = sender
+        self.priority = priority
+        self.last = 0.0
+        self.task = None
+
+
+# 频道级的通知整形：在 publish 入队前合并或攒批，减少订阅者被重复唤醒。
+# publish(message, channel, sender, priority) 负责真正入队并返回 MessageParcel，
+# spawn(coroutine) 创建受 MessageManager 跟踪的后台任务，使空闲判定与 stop() 的排空包含尚未投递的通知
+class ChannelShaper:
+    def __init__(self, policy: DeliveryPolicy, window: float, batch_size: int, publish, spawn):
+        self.policy = policy
+        self._window = window
+        self._batch_size = batch_size
+        self._publish = publish
+        self._spawn = spawn
+        self._latest = dict()  # channel -> 尚未分发的 MessageParcel
+        self._pending: dict[str, _Pending] = dict()
+        self.stats = {"published": 0, "delivered": 0, "merged": 0, "batches": 0}
+
+    async def offer(self, message, channel, sender, priority):
+        self.stats["published"] += 1
+        match self.policy:
+            case DeliveryPolicy.LATEST:
+                parcel = self._latest.get(channel)
+                if parcel is not None and not parcel.dispatched:
+                    parcel.message = message
+                    self.stats["merged"] += 1
+                    return
+                self._latest[channel] = await self._publish(message, channel, sender, priority)
+                self.stats["delivered"] += 1
+            case DeliveryPolicy.DEBOUNCE:
+                pending = self._get_pending(channel, sender, priority)
+                if pending.messages:
+                    self.stats["merged"] += 1
+                pending.messages = [message]
+                pending.sender = sender
+                pending.last = asyncio.get_event_loop().time()
+                if pending.task is None:
+                    pending.task = self._spawn(self._debounce(channel, pending))
+            case DeliveryPolicy.BATCH:
+                pending = self._get_pending(channel, sender, priority)
+                pending.messages.append(message)
+                if len(pending.messages) >= self._batch_size:
+                    if pending.task is not None:
+                        pending.task.cancel()
+                    await self._flush(channel, pending)
+                elif pending.task is None:
+                    pending.task = self._spawn(self._flush_later(channel, pending))
+
+    def _get_pending(self, channel, sender, priority):
+        if channel not in self._pending:
+            self._pending[channel] = _Pending(sender, priority)
+        return self._pending[channel]
+
+    async def _debounce(self, channel, pending: _Pending):
+        loop = asyncio.get_event_loop()
+        while (delay := pending.last + self._window - loop.time()) > 0:
+            await asyncio.sleep(delay)
+        self._pending.pop(channel, None)
+        await self._publish(pending.messages[-1], channel, pending.sender, pending.priority)
+        self.stats["delivered"] += 1
+
+    async def _flush_later(self, channel, pending: _Pending):
+        await asyncio.sleep(self._window)
+        await self._flush(channel, pending)
+
+    async def _flush(self, channel, pending: _Pending):
+        if self._pending.get(channel) is not pending:
+            return
+        self._pending.pop(channel)
+        await self._publish(pending.messages, channel, pending.sender, pending.priority)
+        self.stats["delivered"] += len(pending.messages)
+        self.stats["batches"] += 1
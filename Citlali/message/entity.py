@@ -1,9 +1,10 @@
 import uuid
 from asyncio import Future
+from contextvars import ContextVar
 from datetime import datetime
 from typing import Any
 
-from ..core.type import MessageType
+from ..core.type import MessageType, MessagePriority
 
 
 class MessageContext:
@@ -11,14 +12,29 @@ class MessageContext:
     build_time: float
     type: MessageType
     sender: str | None
+    deadline: float | None  # 绝对时间戳，None 表示不限时
+    parent_mid: int | None  # 发出本消息时正在处理的消息，用于链路追踪
+    trace_id: int  # 链路根消息的 mid
+
+# 未指定优先级时按消息类型决定：请求 > 通知
+DEFAULT_PRIORITY = {
+    MessageType.REQUEST: MessagePriority.NORMAL,
+    MessageType.NOTIFICATION: MessagePriority.LOW,
+}
 
 class MessageParcel:
     message: Any
     recipient: str | None
     message_context: MessageContext
     reply_callback: Future
+    priority: MessagePriority
+    pending_deliveries: int  # 尚未处理完成的投递数，用于消息日志 ack
+    stream_buffer: int  # 流式应答的缓冲区大小
+    dispatched: bool  # 是否已开始分发，LATEST 策略只覆盖尚未分发的通知
+    interrupted: bool  # 是否有投递在完成前被取消，此时不 ack，留待 recover() 重放
 
-    def __init__(self, message: Any, recipient: str | None, sender: str | None, type: MessageType, reply_callback: Future) -> None:
+    def __init__(self, message: Any, recipient: str | None, sender: str | None, type: MessageType, reply_callback: Future,
+                 deadline: float | None = None, priority: MessagePriority | None = None) -> None:
         self.message = message
         self.recipient = recipient
         self.message_context = MessageContext()
@@ -26,10 +42,21 @@ class MessageParcel:
         self.message_context.build_time = datetime.now().timestamp()
         self.message_context.type = type
         self.message_context.sender = sender
+        self.message_context.deadline = deadline
+        self.message_context.parent_mid = None
+        self.message_context.trace_id = self.message_context.mid
         self.reply_callback = reply_callback
+        self.priority = priority if priority is not None else DEFAULT_PRIORITY[type]
+        self.pending_deliveries = 0
+        self.stream_buffer = 16
+        self.dispatched = False
+        self.interrupted = False
 
     def __str__(self) -> str:
         return (f"TYPE:{self.message_context.type} | "
                 f"FROM:{self.message_context.sender} | "
                 f"TO:{self.recipient} | "
                 f"MSG:{self.message} ")
+
+# 当前正在处理的消息上下文，用于在嵌套的 call 中传递 deadline
+current_message_context: ContextVar[MessageContext | None] = ContextVar("current_message_context", default=None)
@@ -0,0 +1,71 @@
+import asyncio
+import itertools
+from asyncio import PriorityQueue, QueueFull
+
+from ..core.type import OverflowPolicy
+from .entity import MessageParcel
+
+
+class MailboxFullError(RuntimeError):
+    pass
+
+
+# 按优先级排序并带老化：排序键为入队时间加上优先级对应的等待窗口，
+# 低优先级消息最多等待 priority.value * aging 秒后即排到新入队的高优先级消息之前
+class PriorityParcelQueue(PriorityQueue):
+    def __init__(self, maxsize: int = 0, aging: float = 1.0):
+        super().__init__(maxsize)
+        self._aging = aging
+        self._sequence = itertools.count()
+
+    def _entry(self, message_parcel: MessageParcel):
+        sort_key = asyncio.get_event_loop().time() + message_parcel.priority.value * self._aging
+        return sort_key, next(self._sequence), message_parcel
+
+    async def put_parcel(self, message_parcel: MessageParcel):
+        await self.put(self._entry(message_parcel))
+
+    def put_parcel_nowait(self, message_parcel: MessageParcel):
+        self.put_nowait(self._entry(message_parcel))
+
+    async def get_parcel(self) -> MessageParcel:
+        return (await self.get())[2]
+
+    def get_parcel_nowait(self) -> MessageParcel:
+        return self.get_nowait()[2]
+
+# 单个接收者的信箱，信箱内同优先级的消息按投递顺序分发
+class Mailbox:
+    def __init__(self, owner, capacity: int = 0, max_in_flight: int | None = None,
+                 overflow_policy: OverflowPolicy = OverflowPolicy.BLOCK, aging: float = 1.0):
+        self.owner = owner
+        # 信箱是否已在就绪队列中，保证同一时刻只被一个分发协程持有
+        self.scheduled = False
+        # capacity 为 0 时不限长度；max_in_flight 为 None 时不限并发
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.overflow_policy = overflow_policy
+        self._parcels = PriorityParcelQueue(capacity, aging)
+
+    async def put(self, message_parcel: MessageParcel):
+        match self.overflow_policy:
+            case OverflowPolicy.BLOCK:
+                await self._parcels.put_parcel(message_parcel)
+            case OverflowPolicy.REJECT:
+                try:
+                    self._parcels.put_parcel_nowait(message_parcel)
+                except QueueFull:
+                    raise MailboxFullError(f"Mailbox of {self.owner} is full") from None
+
+    def get(self) -> MessageParcel:
+        return self._parcels.get_parcel_nowait()
+
+    def full(self):
+        return self._parcels.full()
+
+    def ready(self):
+        # 有待分发的消息且未达到并发上限
+        return len(self) > 0 and (self.max_in_flight is None or self.in_flight < self.max_in_flight)
+
+    def __len__(self):
+        return self._parcels.qsize()
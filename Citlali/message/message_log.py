@@ -0,0 +1,259 @@
+import argparse
+import asyncio
+import importlib
+import inspect
+import json
+import os
+import pickle
+import struct
+import sys
+import time
+
+from loguru import logger
+
+from ..core.type import MessageType, MessagePriority, DispatchMode
+from .entity import MessageParcel
+
+_HEADER = struct.Struct(">I")
+_SEGMENT_PREFIX = "segment-"
+_SEGMENT_SUFFIX = ".log"
+
+
+# 追加写的消息日志：每条 parcel 入队时写入 append 记录，处理完成后写入 ack 记录。
+# 日志按大小切分为多个 segment，fsync 按 fsync_interval 批量执行；
+# 重启后未 ack 的 parcel 可通过 pending() 取回重放，最旧的一段已全部 ack 的 segment 会被删除。
+class MessageLog:
+    def __init__(self, directory, segment_size: int = 64 * 1024 * 1024, fsync_interval: float = 0.05):
+        self._directory = directory
+        self._segment_size = segment_size
+        self._fsync_interval = fsync_interval
+        os.makedirs(directory, exist_ok=True)
+
+        self._unacked: dict[int, int] = dict()  # mid -> segment index
+        self._segment_unacked: dict[int, set] = dict()
+        self._recovered: dict[int, dict] = dict()  # 启动时从旧 segment 中恢复的未 ack 记录
+        segments = self.list_segments(directory)
+        self._segments = [index for index, _ in segments]  # 现存 segment，按序号升序
+        self._segment_index = segments[-1][0] + 1 if segments else 0
+        self._load()
+
+        self._segment_unacked[self._segment_index] = set()
+        self._segments.append(self._segment_index)
+        self._file = open(self._segment_path(self._segment_index), "ab")
+        self._segment_bytes = 0
+        self._flush_handle = None
+
+    @staticmethod
+    def list_segments(directory):
+        segments = []
+        for filename in os.listdir(directory):
+            if filename.startswith(_SEGMENT_PREFIX) and filename.endswith(_SEGMENT_SUFFIX):
+                index = int(filename[len(_SEGMENT_PREFIX):-len(_SEGMENT_SUFFIX)])
+                segments.append((index, os.path.join(directory, filename)))
+        return sorted(segments)
+
+    @classmethod
+    def read_records(cls, directory):
+        # 依次读取所有 segment，崩溃时写了一半的末尾记录会被忽略
+        for index, path in cls.list_segments(directory):
+            with open(path, "rb") as f:
+                while True:
+                    header = f.read(_HEADER.size)
+                    if len(header) < _HEADER.size:
+                        break
+                    payload = f.read(_HEADER.unpack(header)[0])
+                    if len(payload) < _HEADER.unpack(header)[0]:
+                        logger.warning("Truncated record at the end of {}", path)
+                        break
+                    yield index, pickle.loads(payload)
+
+    @classmethod
+    def read_pending(cls, directory):
+        pending = dict()
+        for _, record in cls.read_records(directory):
+            match record["op"]:
+                case "append":
+                    pending[record["mid"]] = record
+                case "ack":
+                    pending.pop(record["mid"], None)
+        return list(pending.values())
+
+    def _segment_path(self, index):
+        return os.path.join(self._directory, f"{_SEGMENT_PREFIX}{index:08d}{_SEGMENT_SUFFIX}")
+
+    def _load(self):
+        for index, record in self.read_records(self._directory):
+            match record["op"]:
+                case "append":
+                    self._unacked[record["mid"]] = index
+                    self._segment_unacked.setdefault(index, set()).add(record["mid"])
+                    self._recovered[record["mid"]] = record
+                case "ack":
+                    index = self._unacked.pop(record["mid"], None)
+                    if index is not None:
+                        self._segment_unacked[index].discard(record["mid"])
+                        self._recovered.pop(record["mid"], None)
+        self._truncate()
+
+    def pending(self):
+        return list(self._recovered.values())
+
+    def append(self, message_parcel: MessageParcel):
+        message_context = message_parcel.message_context
+        record = {
+            "op": "append",
+            "mid": message_context.mid,
+            "type": message_context.type.value,
+            "recipient": message_parcel.recipient,
+            "sender": message_context.sender,
+            "message": message_parcel.message,
+            "priority": message_parcel.priority.value,
+            "deadline": message_context.deadline,
+            "build_time": message_context.build_time,
+        }
+        try:
+            payload = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            logger.warning("Message {} is not picklable and will not be logged: {}", message_context.mid, e)
+            return False
+        self._unacked[message_context.mid] = self._segment_index
+        self._segment_unacked[self._segment_index].add(message_context.mid)
+        self._write(payload)
+        return True
+
+    def ack(self, mid):
+        index = self._unacked.pop(mid, None)
+        if index is None:
+            return
+        self._recovered.pop(mid, None)
+        self._segment_unacked[index].discard(mid)
+        self._write(pickle.dumps({"op": "ack", "mid": mid}, protocol=pickle.HIGHEST_PROTOCOL))
+        if index != self._segment_index:
+            self._truncate()
+
+    def _write(self, payload):
+        self._file.write(_HEADER.pack(len(payload)) + payload)
+        self._segment_bytes += _HEADER.size + len(payload)
+        if self._segment_bytes >= self._segment_size:
+            self._rotate()
+        elif self._flush_handle is None:
+            # 批量 fsync：一个间隔内的所有写入共用一次落盘
+            self._flush_handle = asyncio.get_event_loop().call_later(self._fsync_interval, self._flush)
+
+    def _flush(self):
+        self._flush_handle = None
+        self._file.flush()
+        # 复制文件描述符后在线程池中落盘，避免阻塞事件循环，也不受 segment 切换关闭文件的影响
+        asyncio.get_event_loop().run_in_executor(None, _fsync_and_close, os.dup(self._file.fileno()))
+
+    def _rotate(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._segment_index += 1
+        self._segment_unacked[self._segment_index] = set()
+        self._segments.append(self._segment_index)
+        self._file = open(self._segment_path(self._segment_index), "ab")
+        self._segment_bytes = 0
+        self._truncate()
+
+    def _truncate(self):
+        # 只从最旧的一端删除已全部 ack 的 segment：较新 segment 中的 ack 记录可能对应更旧 segment 中的 append，
+        # 必须保留到这些 append 所在的 segment 都删除之后，否则重启时已 ack 的 parcel 会被再次取回
+        while self._segments and self._segments[0] != self._segment_index \
+                and not self._segment_unacked.get(self._segments[0]):
+            index = self._segments.pop(0)
+            self._segment_unacked.pop(index, None)
+            path = self._segment_path(index)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def close(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+
+def _fsync_and_close(fd):
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def _load_setup(spec):
+    module_name, _, func_name = spec.partition(":")
+    return getattr(importlib.import_module(module_name), func_name)
+
+async def _replay(args):
+    from ..core.runtime import CitlaliRuntime
+
+    records = [record for _, record in MessageLog.read_records(args.directory) if record["op"] == "append"] \
+        if args.all else MessageLog.read_pending(args.directory)
+    runtime = CitlaliRuntime(dispatch_mode=DispatchMode[args.dispatch_mode], dispatcher_num=args.dispatchers)
+    runtime.run()
+    setup = _load_setup(args.setup)(runtime)
+    if inspect.isawaitable(setup):
+        await setup
+
+    futures = []
+    start = time.perf_counter()
+    first_build_time = records[0]["build_time"] if records else 0
+    for record in records:
+        if args.timing:
+            # 按原始 build_time 间隔重放
+            delay = (record["build_time"] - first_build_time) / args.speed - (time.perf_counter() - start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        future = await runtime.message_manager.put_message(record["message"], record["recipient"], record["sender"],
+                                                           MessageType(record["type"]),
+                                                           priority=MessagePriority(record["priority"]))
+        if future is not None:
+            futures.append(future)
+    results = await asyncio.gather(*futures, return_exceptions=True)
+    await runtime.stop()
+    return {
+        "records": len(records),
+        "requests": len(futures),
+        "errors": sum(isinstance(result, BaseException) for result in results),
+        "elapsed_s": time.perf_counter() - start,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or replay a Citlali message log")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    inspect_parser = subparsers.add_parser("inspect", help="print logged parcels as JSON lines")
+    inspect_parser.add_argument("directory")
+    inspect_parser.add_argument("--all", action="store_true", help="include acknowledged parcels")
+
+    replay_parser = subparsers.add_parser("replay", help="replay logged parcels against a fresh runtime")
+    replay_parser.add_argument("directory")
+    replay_parser.add_argument("--setup", required=True,
+                               help="module:function that registers workers on the runtime, e.g. my_app.setup:register")
+    replay_parser.add_argument("--all", action="store_true", help="replay acknowledged parcels as well")
+    replay_parser.add_argument("--timing", action="store_true", help="preserve the original inter-arrival times")
+    replay_parser.add_argument("--speed", type=float, default=1.0, help="time scale used with --timing")
+    replay_parser.add_argument("--dispatch-mode", default=DispatchMode.SINGLE.name,
+                               choices=[mode.name for mode in DispatchMode])
+    replay_parser.add_argument("--dispatchers", type=int, default=1)
+    args = parser.parse_args()
+
+    match args.command:
+        case "inspect":
+            records = [record for _, record in MessageLog.read_records(args.directory) if record["op"] == "append"] \
+                if args.all else MessageLog.read_pending(args.directory)
+            for record in records:
+                print(json.dumps({**record, "mid": str(record["mid"]), "message": repr(record["message"])},
+                                 ensure_ascii=False))
+        case "replay":
+            print(json.dumps(asyncio.run(_replay(args))))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,66 +1,377 @@
 import asyncio
+import inspect
+import time
 from asyncio import Queue
+from datetime import datetime
 
 from loguru import logger
 
 from ..core.worker_keeper import WorkerKeeper
-from ..core.type import MessageType, ListenerType
+from ..core.type import MessageType, ListenerType, DispatchMode, OverflowPolicy, MessagePriority, DeliveryPolicy
 from .channel_keeper import ChannelKeeper
-from .entity import MessageParcel
+from .coalesce import ChannelShaper
+from .entity import MessageParcel, current_message_context
+from .mailbox import Mailbox, MailboxFullError, PriorityParcelQueue
+from .stream import ReplyStream
+from .topic import ChannelTrie
 
 
 class MessageManager:
-    def __init__(self, worker_keeper: WorkerKeeper):
-        self._queue: [MessageParcel] = Queue()
+    def __init__(self, worker_keeper: WorkerKeeper, dispatch_mode: DispatchMode = DispatchMode.SINGLE, dispatcher_num: int = 1,
+                 priority_aging: float = 1.0, notify_timeout: float | None = None):
+        self._priority_aging = priority_aging
+        self._queue = PriorityParcelQueue(aging=priority_aging)
         self._worker_keeper = worker_keeper
 
-        self._channel_keeper = ChannelKeeper(self._worker_keeper)
+        self._channel_keeper = ChannelKeeper(self._worker_keeper, notify_timeout)
+
+        # SHARDED模式下每个Worker拥有独立信箱，由多个分发协程轮流处理就绪的信箱
+        self._dispatch_mode = dispatch_mode
+        self._dispatcher_num = dispatcher_num
+        self._worker_mailboxes: dict[str, Mailbox] = dict()
+        self._ready_mailboxes: Queue[Mailbox] = Queue()
+
+        # 应答直接完成调用方 future，不再经过队列；观察者仍可收到应答事件用于追踪
+        self._response_observers = []
+
+        self._message_log = None
+        self._tracer = None
+
+        # 频道级通知整形策略，按频道名或通配模式配置
+        self._channel_shapers: dict[str, ChannelShaper] = dict()
+        self._shaper_trie = ChannelTrie()
+        self._shaper_cache: dict[str, ChannelShaper | None] = dict()
+
+        # 空闲判定：已入队未分发的消息数为 0，且所有分发出的 listener 任务均已结束
+        self._dispatchers: list[asyncio.Task] = []
+        self._in_flight_tasks: set[asyncio.Task] = set()
+        self._pending_parcels = 0
+        self._idle_event = asyncio.Event()
+        self._idle_event.set()
 
     def subscribe(self, worker_name, channels):
         return self._channel_keeper.subscribe(worker_name, channels)
 
+    def unsubscribe(self, worker_name):
+        return self._channel_keeper.unsubscribe(worker_name)
+
+    def set_message_log(self, message_log):
+        self._message_log = message_log
+
+    def set_tracer(self, tracer):
+        self._tracer = tracer
+
+    def set_channel_policy(self, channel, policy: DeliveryPolicy, window: float = 0.1, batch_size: int = 10):
+        self._channel_shapers[channel] = ChannelShaper(policy, window, batch_size, self._publish_now,
+                                                       self._track_background)
+        self._shaper_trie.add(channel, channel)
+        self._shaper_cache.clear()
+
+    def channel_stats(self):
+        return {channel: dict(shaper.stats, policy=shaper.policy.name) for channel, shaper in self._channel_shapers.items()}
+
+    def _get_shaper(self, channel):
+        if channel not in self._shaper_cache:
+            matched = self._shaper_trie.match(channel)
+            self._shaper_cache[channel] = self._channel_shapers[matched[0]] if matched else None
+        return self._shaper_cache[channel]
+
+    def add_response_observer(self, observer):
+        # observer(reply, sender, recipient, request_context)
+        self._response_observers.append(observer)
+
+    def check_mailbox_limit(self):
+        if self._dispatch_mode is not DispatchMode.SHARDED:
+            raise ValueError("Mailbox limits require DispatchMode.SHARDED")
+
+    def set_mailbox_limit(self, worker_name, mailbox_size: int = 0, max_in_flight: int | None = None,
+                          overflow_policy: OverflowPolicy = OverflowPolicy.BLOCK):
+        self.check_mailbox_limit()
+        self._worker_mailboxes[worker_name] = Mailbox(worker_name, mailbox_size, max_in_flight, overflow_policy,
+                                                      self._priority_aging)
+
     def start_listen(self):
-        async def _run():
-            while True:
-                message_parcel = await self._queue.get()
-                await self.on_message(message_parcel)
-        asyncio.create_task(_run())
+        match self._dispatch_mode:
+            case DispatchMode.SINGLE:
+                async def _run():
+                    while True:
+                        message_parcel = await self._queue.get_parcel()
+                        task = await self.on_message(message_parcel)
+                        task.add_done_callback(lambda t, p=message_parcel: self._on_delivered(p, t))
+                self._dispatchers.append(asyncio.create_task(_run()))
+            case DispatchMode.SHARDED:
+                for _ in range(self._dispatcher_num):
+                    self._dispatchers.append(asyncio.create_task(self._dispatch()))
+
+    def is_idle(self):
+        return self._pending_parcels == 0 and not self._in_flight_tasks
+
+    async def wait_until_idle(self):
+        while not self.is_idle():
+            await self._idle_event.wait()
+
+    async def stop_listen_when_idle(self, timeout: float | None = None):
+        # 等待全部消息处理完毕；超过 timeout 仍未完成时取消剩余 listener 任务，返回是否完整排空
+        drained = True
+        try:
+            await asyncio.wait_for(self.wait_until_idle(), timeout)
+        except TimeoutError:
+            drained = False
+            logger.warning("Drain timed out with {} queued parcels and {} running tasks, cancelling",
+                           self._pending_parcels, len(self._in_flight_tasks))
+            tasks = list(self._in_flight_tasks)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        for dispatcher in self._dispatchers:
+            dispatcher.cancel()
+        self._dispatchers.clear()
+        return drained
 
-    async def stop_listen_when_idle(self):
-        await self._queue.join()
+    def _add_pending(self):
+        self._pending_parcels += 1
+        self._idle_event.clear()
 
-    async def put_message(self, message, recipient, sender, message_type: MessageType):
+    def _track_task(self, task: asyncio.Task):
+        self._pending_parcels -= 1
+        self._in_flight_tasks.add(task)
+        task.add_done_callback(self._untrack_task)
+        return task
+
+    def _track_background(self, coroutine):
+        # 非消息分发产生的后台任务（如整形策略的延迟投递），同样计入空闲判定
+        task = asyncio.create_task(coroutine)
+        self._in_flight_tasks.add(task)
+        self._idle_event.clear()
+        task.add_done_callback(self._untrack_task)
+        return task
+
+    def _untrack_task(self, task: asyncio.Task):
+        self._in_flight_tasks.discard(task)
+        if self.is_idle():
+            self._idle_event.set()
+
+    async def put_message(self, message, recipient, sender, message_type: MessageType, timeout: float | None = None,
+                          priority: MessagePriority | None = None, stream_buffer: int = 16):
+        if message_type is MessageType.NOTIFICATION and self._channel_shapers:
+            shaper = self._get_shaper(recipient)
+            if shaper is not None:
+                await shaper.offer(message, recipient, sender, priority)
+                return None
         # 仅在MessageType.REQUEST时有Reply
         reply_callback = asyncio.get_event_loop().create_future() if message_type is MessageType.REQUEST else None
+        deadline = self._get_deadline(timeout) if message_type is MessageType.REQUEST else None
 
-        message_parcel = MessageParcel(message, recipient, sender, message_type, reply_callback)
-        await self._queue.put(message_parcel)
+        message_parcel = MessageParcel(message, recipient, sender, message_type, reply_callback, deadline, priority)
+        message_parcel.stream_buffer = stream_buffer
+        self._link_parent(message_parcel)
+        if self._message_log is not None:
+            self._message_log.append(message_parcel)
+        if deadline is not None:
+            timer = asyncio.get_event_loop().call_later(max(deadline - datetime.now().timestamp(), 0),
+                                                        self._expire, message_parcel)
+            reply_callback.add_done_callback(lambda _: timer.cancel())
+        try:
+            await self._put(message_parcel)
+        except BaseException:
+            self._abandon(message_parcel)
+            # 取消应答以撤销 deadline 定时器，避免无人等待的 future 被设置超时异常
+            if reply_callback is not None:
+                reply_callback.cancel()
+            raise
         return reply_callback if message_type is MessageType.REQUEST else None
 
-    async def on_message(self, message_parcel):
+    async def _publish_now(self, message, channel, sender, priority):
+        message_parcel = MessageParcel(message, channel, sender, MessageType.NOTIFICATION, None, None, priority)
+        self._link_parent(message_parcel)
+        if self._message_log is not None:
+            self._message_log.append(message_parcel)
+        try:
+            await self._put(message_parcel)
+        except BaseException:
+            self._abandon(message_parcel)
+            raise
+        return message_parcel
+
+    def _abandon(self, message_parcel):
+        # 入队失败（如信箱已满）的 parcel 不会被分发，直接 ack，避免重启后被重放
+        if self._message_log is not None:
+            self._message_log.ack(message_parcel.message_context.mid)
+
+    @staticmethod
+    def _link_parent(message_parcel):
+        parent_context = current_message_context.get()
+        if parent_context is not None:
+            message_parcel.message_context.parent_mid = parent_context.mid
+            message_parcel.message_context.trace_id = parent_context.trace_id
+
+    @staticmethod
+    def _get_deadline(timeout):
+        # 嵌套调用继承上游 deadline，取两者中较早者
+        deadline = datetime.now().timestamp() + timeout if timeout is not None else None
+        parent_context = current_message_context.get()
+        if parent_context is not None and parent_context.deadline is not None:
+            deadline = parent_context.deadline if deadline is None else min(deadline, parent_context.deadline)
+        return deadline
+
+    @staticmethod
+    def _expire(message_parcel):
+        if not message_parcel.reply_callback.done():
+            message_parcel.reply_callback.set_exception(
+                TimeoutError(f"Call to {message_parcel.recipient} exceeded its deadline"))
+
+    async def _put(self, message_parcel: MessageParcel):
+        match self._dispatch_mode:
+            case DispatchMode.SINGLE:
+                message_parcel.pending_deliveries = 1
+                await self._queue.put_parcel(message_parcel)
+                self._add_pending()
+            case DispatchMode.SHARDED:
+                await self._deliver(message_parcel)
+
+    async def _deliver(self, message_parcel: MessageParcel):
+        # 按接收者拆分到各自信箱，同一 sender→recipient 的消息保持顺序
+        match message_parcel.message_context.type:
+            case MessageType.REQUEST:
+                message_parcel.pending_deliveries = 1
+                await self._enqueue(self._get_mailbox(self._worker_mailboxes, message_parcel.recipient), message_parcel)
+            case MessageType.NOTIFICATION:
+                worker_list = self._channel_keeper.get_in_channel_workers(message_parcel.recipient)
+                mailboxes = [self._get_mailbox(self._worker_mailboxes, worker_name) for worker_name in worker_list or []]
+                # REJECT策略下先整体检查，避免通知只投递到部分订阅者
+                for mailbox in mailboxes:
+                    if mailbox.overflow_policy is OverflowPolicy.REJECT and mailbox.full():
+                        raise MailboxFullError(f"Mailbox of {mailbox.owner} is full")
+                message_parcel.pending_deliveries = len(mailboxes)
+                if not mailboxes:
+                    self._on_delivered(message_parcel)
+                for mailbox in mailboxes:
+                    await self._enqueue(mailbox, message_parcel)
+
+    def _get_mailbox(self, mailboxes, owner):
+        if owner not in mailboxes:
+            mailboxes[owner] = Mailbox(owner, aging=self._priority_aging)
+        return mailboxes[owner]
+
+    async def _enqueue(self, mailbox: Mailbox, message_parcel: MessageParcel):
+        await mailbox.put(message_parcel)
+        self._add_pending()
+        self._schedule(mailbox)
+
+    def _schedule(self, mailbox: Mailbox):
+        if not mailbox.scheduled and mailbox.ready():
+            mailbox.scheduled = True
+            self._ready_mailboxes.put_nowait(mailbox)
+
+    def _release(self, mailbox: Mailbox):
+        mailbox.in_flight -= 1
+        self._schedule(mailbox)
+
+    def _on_delivered(self, message_parcel: MessageParcel, task: asyncio.Task | None = None):
+        # 被取消且调用方未得到应答的投递（如 stop 超时时取消的任务）视为未完成
+        if task is not None and task.cancelled() and \
+                (message_parcel.reply_callback is None or not message_parcel.reply_callback.done()):
+            message_parcel.interrupted = True
+        message_parcel.pending_deliveries -= 1
+        if message_parcel.pending_deliveries <= 0 and not message_parcel.interrupted and self._message_log is not None:
+            self._message_log.ack(message_parcel.message_context.mid)
+
+    async def _dispatch(self):
+        while True:
+            mailbox = await self._ready_mailboxes.get()
+            message_parcel = mailbox.get()
+            mailbox.in_flight += 1
+            task = await self.on_message(message_parcel, mailbox.owner)
+            task.add_done_callback(lambda t, m=mailbox, p=message_parcel: (self._release(m), self._on_delivered(p, t)))
+            # 每次只分发一条消息后重新排队，保证各信箱之间轮转而非互相阻塞；
+            # 达到并发上限的信箱暂不排队，待任务完成后由 _release 重新调度
+            mailbox.scheduled = False
+            self._schedule(mailbox)
+
+    async def on_message(self, message_parcel, worker_name=None):
         logger.debug("HANDLE MESSAGE: {}", message_parcel)
+        message_parcel.dispatched = True
         match message_parcel.message_context.type:
             case MessageType.REQUEST:
-                asyncio.create_task(self._call(message_parcel))
+                coroutine = self._call(message_parcel)
             case MessageType.NOTIFICATION:
-                asyncio.create_task(self._notice(message_parcel))
-            case MessageType.RESPONSE:
-                asyncio.create_task(self._reply(message_parcel))
+                if worker_name is None:
+                    coroutine = self._notice(message_parcel)
+                else:
+                    coroutine = self._notice_worker(message_parcel, worker_name)
+        if self._tracer is not None:
+            coroutine = self._traced(coroutine, message_parcel, worker_name, time.time())
+        return self._track_task(asyncio.create_task(coroutine))
 
-    async def _reply(self, message_parcel):
-        message_parcel.reply_callback.set_result(message_parcel.message)
+    async def _traced(self, coroutine, message_parcel, worker_name, dispatch_time):
+        start_time = time.time()
+        error = None
+        try:
+            return await coroutine
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            reply_callback = message_parcel.reply_callback
+            if error is None and reply_callback is not None and reply_callback.done() and not reply_callback.cancelled() \
+                    and reply_callback.exception() is not None:
+                error = type(reply_callback.exception()).__name__
+            self._tracer.record(message_parcel, worker_name, dispatch_time, start_time, time.time(), error)
 
     async def _call(self, message_parcel):
+        reply_callback = message_parcel.reply_callback
+        if reply_callback.done():
+            return None
         worker = self._worker_keeper.get_worker(message_parcel.recipient)
-        if worker is not None:
+        if worker is None:
+            reply_callback.set_exception(LookupError(f"Worker {message_parcel.recipient} not found"))
+            return None
+
+        # 调用方超时或取消时，一并取消下游 listener 任务
+        call_task = asyncio.current_task()
+        reply_callback.add_done_callback(
+            lambda future: call_task.cancel() if future.cancelled() or future.exception() is not None else None)
+        current_message_context.set(message_parcel.message_context)
+        try:
             reply = await worker.listen(ListenerType.ON_CALLED, message_parcel.message, message_parcel.message_context)
-            await self._queue.put(MessageParcel(message=reply,
-                                                recipient=message_parcel.message_context.sender,
-                                                sender=message_parcel.recipient,
-                                                type=MessageType.RESPONSE,
-                                                reply_callback=message_parcel.reply_callback))
-        else:
+        except Exception as e:
+            logger.exception("Worker {} failed to handle {}", message_parcel.recipient, message_parcel)
+            if not reply_callback.done():
+                reply_callback.set_exception(e)
+            return None
+        if inspect.isasyncgen(reply):
+            # 异步生成器 listener：先以 ReplyStream 完成调用，再在当前任务中持续产出
+            stream = ReplyStream(message_parcel.stream_buffer, call_task)
+            buffer = stream.buffer
+            if not reply_callback.done():
+                reply_callback.set_result(stream)
+            self._emit_response(stream, message_parcel)
+            # 释放对 ReplyStream 的引用，调用方丢弃流后即可被回收并取消本任务
+            del stream, reply_callback
+            message_parcel.reply_callback = None
+            deadline = message_parcel.message_context.deadline
+            try:
+                await ReplyStream.pump(buffer, reply,
+                                       max(deadline - datetime.now().timestamp(), 0) if deadline is not None else None)
+            except Exception:
+                logger.exception("Worker {} failed while streaming {}", message_parcel.recipient, message_parcel)
             return None
+        if not reply_callback.done():
+            reply_callback.set_result(reply)
+        self._emit_response(reply, message_parcel)
+
+    def _emit_response(self, reply, message_parcel):
+        logger.debug("HANDLE MESSAGE: TYPE:{} | FROM:{} | TO:{} | MSG:{} ", MessageType.RESPONSE,
+                     message_parcel.recipient, message_parcel.message_context.sender, reply)
+        for observer in self._response_observers:
+            observer(reply, message_parcel.recipient, message_parcel.message_context.sender, message_parcel.message_context)
 
     async def _notice(self, message_parcel):
+        current_message_context.set(message_parcel.message_context)
         await self._channel_keeper.publish(message_parcel)
+
+    async def _notice_worker(self, message_parcel, worker_name):
+        current_message_context.set(message_parcel.message_context)
+        worker = self._worker_keeper.get_worker(worker_name)
+        if worker is not None:
+            await self._channel_keeper.notify(worker, message_parcel)
@@ -0,0 +1,92 @@
+import asyncio
+import weakref
+
+_END = object()
+
+
+class _StreamBuffer(asyncio.Queue):
+    # 调用方关闭或丢弃流后置为 True，生产端据此区分主动关闭与关停时的取消
+    closed = False
+
+
+def _close(buffer: _StreamBuffer, producer: asyncio.Task | None):
+    buffer.closed = True
+    if producer is not None and not producer.done():
+        producer.cancel()
+
+
+# 流式应答：被调用方的 listener 为异步生成器时，调用方拿到 ReplyStream 并以 async for 逐个读取。
+# 缓冲区写满后生成器暂停（流控），调用方 aclose() 或超过 deadline 时取消生成器
+class ReplyStream:
+    def __init__(self, buffer: int = 16, producer: asyncio.Task | None = None):
+        self._queue = _StreamBuffer(buffer)
+        self._producer = producer
+        self._done = False
+        # 调用方未 aclose() 就丢弃流时（如 break 跳出 async for），回收时取消生成器，避免其阻塞在写满的缓冲区上。
+        # 生产端只持有缓冲区，不引用 ReplyStream 本身
+        self._finalizer = weakref.finalize(self, _close, self._queue, producer)
+        self._finalizer.atexit = False
+
+    @classmethod
+    def of(cls, *items):
+        stream = cls(len(items) + 1)
+        for item in items:
+            stream._queue.put_nowait((item, None))
+        stream._queue.put_nowait((_END, None))
+        return stream
+
+    @property
+    def buffer(self):
+        return self._queue
+
+    def feed(self, item):
+        # 由外部（如跨进程连接）逐项写入的流，需以无界缓冲区创建
+        self._queue.put_nowait((item, None))
+
+    def finish(self, error: BaseException | None = None):
+        self._queue.put_nowait((_END, error))
+
+    @staticmethod
+    async def pump(buffer: _StreamBuffer, generator, deadline_delay: float | None = None):
+        # 在被调用方的任务中运行，把生成器产出的结果写入缓冲区；调用方关闭流导致的取消视为正常结束
+        try:
+            async with asyncio.timeout(deadline_delay):
+                async for item in generator:
+                    await buffer.put((item, None))
+        except TimeoutError:
+            await buffer.put((_END, TimeoutError("Stream exceeded its deadline")))
+        except asyncio.CancelledError:
+            if not buffer.closed:
+                raise
+            asyncio.current_task().uncancel()
+        except Exception as e:
+            await buffer.put((_END, e))
+            raise
+        else:
+            await buffer.put((_END, None))
+        finally:
+            await generator.aclose()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._done:
+            raise StopAsyncIteration
+        item, error = await self._queue.get()
+        if item is _END:
+            self._done = True
+            if error is not None:
+                raise error
+            raise StopAsyncIteration
+        return item
+
+    async def aclose(self):
+        self._done = True
+        self._finalizer()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
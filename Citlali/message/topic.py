@@ -0,0 +1,73 @@
+# 分层频道名以 "." 分隔，如 app.plan.created；订阅时 "*" 匹配恰好一段，"#" 匹配零或多段
+SEPARATOR = "."
+SINGLE_WILDCARD = "*"
+MULTI_WILDCARD = "#"
+
+
+def is_pattern(channel):
+    return any(segment in (SINGLE_WILDCARD, MULTI_WILDCARD) for segment in channel.split(SEPARATOR))
+
+def topic_matches(pattern, channel):
+    trie = ChannelTrie()
+    trie.add(pattern, pattern)
+    return bool(trie.match(channel))
+
+
+class _Node:
+    __slots__ = ("children", "values")
+
+    def __init__(self):
+        self.children: dict[str, _Node] = dict()
+        self.values: dict = dict()  # 订阅值 -> 订阅序号
+
+
+# 按频道分段建立的前缀树，match 的代价与频道层数相关，而与订阅数量无关
+class ChannelTrie:
+    def __init__(self):
+        self._root = _Node()
+        self._sequence = 0
+
+    def add(self, pattern, value):
+        node = self._root
+        for segment in pattern.split(SEPARATOR):
+            node = node.children.setdefault(segment, _Node())
+        if value not in node.values:
+            node.values[value] = self._sequence
+            self._sequence += 1
+
+    def remove(self, pattern, value):
+        path = [self._root]
+        for segment in pattern.split(SEPARATOR):
+            node = path[-1].children.get(segment)
+            if node is None:
+                return
+            path.append(node)
+        path[-1].values.pop(value, None)
+        # 回收空节点
+        for parent, segment in zip(reversed(path[:-1]), reversed(pattern.split(SEPARATOR))):
+            node = parent.children[segment]
+            if node.values or node.children:
+                break
+            del parent.children[segment]
+
+    def match(self, channel):
+        # 返回匹配的订阅值，按订阅先后排序并去重
+        found = dict()
+        self._match(self._root, channel.split(SEPARATOR), 0, found)
+        return sorted(found, key=found.get)
+
+    def _match(self, node, segments, i, found):
+        multi = node.children.get(MULTI_WILDCARD)
+        if multi is not None:
+            for j in range(i, len(segments) + 1):
+                self._match(multi, segments, j, found)
+        if i == len(segments):
+            for value, sequence in node.values.items():
+                found.setdefault(value, sequence)
+            return
+        child = node.children.get(segments[i])
+        if child is not None:
+            self._match(child, segments, i + 1, found)
+        single = node.children.get(SINGLE_WILDCARD)
+        if single is not None:
+            self._match(single, segments, i + 1, found)
@@ -0,0 +1,190 @@
+import argparse
+import json
+import sys
+from collections import defaultdict
+
+from ..core.type import MessageType
+from .entity import MessageParcel
+
+_TRACE_FORMATS = ("jsonl", "otlp")
+
+
+# 消息链路追踪：每次投递记录一个 span（enqueue → dispatch → handler start → handler end），
+# 通过 trace_id / parent_mid 串起嵌套的 call 与 publish。span 先缓存在内存中，按 batch_size 批量写入文件
+class MessageTracer:
+    def __init__(self, path, format: str = "jsonl", batch_size: int = 256):
+        if format not in _TRACE_FORMATS:
+            raise ValueError(f"Unknown trace format {format}, expected one of {_TRACE_FORMATS}")
+        self._path = path
+        self._format = format
+        self._batch_size = batch_size
+        self._buffer = []
+
+    def record(self, message_parcel: MessageParcel, worker_name, dispatch_time, start_time, end_time, error=None):
+        message_context = message_parcel.message_context
+        # 通知的接收者是频道；SINGLE 模式下一次扇出只有一个 span，不对应具体 Worker
+        notification = message_context.type is MessageType.NOTIFICATION
+        if worker_name is None and not notification:
+            worker_name = message_parcel.recipient
+        self._buffer.append({
+            "trace_id": str(message_context.trace_id),
+            "mid": str(message_context.mid),
+            "parent_mid": str(message_context.parent_mid) if message_context.parent_mid is not None else None,
+            "type": message_context.type.name,
+            "sender": message_context.sender,
+            "recipient": message_parcel.recipient,
+            "worker": worker_name,
+            "channel": message_parcel.recipient if notification else None,
+            "enqueue": message_context.build_time,
+            "dispatch": dispatch_time,
+            "start": start_time,
+            "end": end_time,
+            "error": error,
+        })
+        if len(self._buffer) >= self._batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        with open(self._path, "a", encoding="utf-8") as f:
+            if self._format == "jsonl":
+                for span in self._buffer:
+                    f.write(json.dumps(span, ensure_ascii=False) + "\n")
+            else:
+                f.write(json.dumps(_to_otlp(self._buffer), ensure_ascii=False) + "\n")
+        self._buffer = []
+
+    def close(self):
+        self.flush()
+
+
+def _span_id(mid):
+    return format(int(mid) & (2 ** 64 - 1), "016x")
+
+def _to_otlp(spans):
+    # OTLP/JSON 的 ExportTraceServiceRequest，每行一批，可直接交给 OpenTelemetry Collector 的 file receiver
+    def _attribute(key, value):
+        return {"key": key, "value": {"stringValue": str(value)}}
+
+    return {"resourceSpans": [{
+        "resource": {"attributes": [_attribute("service.name", "citlali")]},
+        "scopeSpans": [{
+            "scope": {"name": "Citlali.message.trace"},
+            "spans": [{
+                "traceId": format(int(span["trace_id"]), "032x"),
+                "spanId": _span_id(span["mid"]),
+                **({"parentSpanId": _span_id(span["parent_mid"])} if span["parent_mid"] is not None else {}),
+                "name": f"{span['type']} {span['worker'] or span['channel']}",
+                "kind": 1,
+                "startTimeUnixNano": str(int(span["enqueue"] * 1e9)),
+                "endTimeUnixNano": str(int(span["end"] * 1e9)),
+                "attributes": [_attribute(key, span[key]) for key in ("sender", "recipient", "worker", "channel")
+                               if span[key] is not None] + [
+                    _attribute("citlali.dispatch", span["dispatch"]),
+                    _attribute("citlali.start", span["start"]),
+                ],
+                "status": {"code": 2, "message": span["error"]} if span["error"] else {"code": 1},
+            } for span in spans],
+        }],
+    }]}
+
+def load_spans(path):
+    spans = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            if "resourceSpans" not in record:
+                spans.append(record)
+                continue
+            for resource_spans in record["resourceSpans"]:
+                for scope_spans in resource_spans["scopeSpans"]:
+                    for span in scope_spans["spans"]:
+                        attributes = {a["key"]: a["value"]["stringValue"] for a in span["attributes"]}
+                        spans.append({
+                            "trace_id": span["traceId"],
+                            "mid": span["spanId"],
+                            "parent_mid": span.get("parentSpanId"),
+                            "type": span["name"].split(" ", 1)[0],
+                            "sender": attributes.get("sender"),
+                            "recipient": attributes.get("recipient"),
+                            "worker": attributes.get("worker"),
+                            "channel": attributes.get("channel"),
+                            "enqueue": int(span["startTimeUnixNano"]) / 1e9,
+                            "dispatch": float(attributes["citlali.dispatch"]),
+                            "start": float(attributes["citlali.start"]),
+                            "end": int(span["endTimeUnixNano"]) / 1e9,
+                            "error": span["status"].get("message"),
+                        })
+    return spans
+
+def critical_path(spans):
+    # 从根 span 出发，每一层选择结束最晚的子 span，即决定整条链路耗时的路径
+    children = defaultdict(list)
+    mids = {span["mid"] for span in spans}
+    for span in spans:
+        children[span["parent_mid"] if span["parent_mid"] in mids else None].append(span)
+    path = []
+    candidates = children[None]
+    while candidates:
+        span = max(candidates, key=lambda s: s["end"])
+        path.append(span)
+        candidates = children[span["mid"]]
+    return path
+
+def summarize(spans, top: int = 5):
+    traces = defaultdict(list)
+    for span in spans:
+        traces[span["trace_id"]].append(span)
+    summary = []
+    for trace_id, trace_spans in traces.items():
+        begin = min(span["enqueue"] for span in trace_spans)
+        summary.append({
+            "trace_id": trace_id,
+            "spans": len(trace_spans),
+            "wall_ms": (max(span["end"] for span in trace_spans) - begin) * 1000,
+            "critical_path": [{
+                "worker": span["worker"],
+                "channel": span.get("channel"),
+                "type": span["type"],
+                "offset_ms": (span["enqueue"] - begin) * 1000,
+                "queue_ms": (span["start"] - span["enqueue"]) * 1000,
+                "handler_ms": (span["end"] - span["start"]) * 1000,
+                "error": span["error"],
+            } for span in critical_path(trace_spans)],
+        })
+    summary.sort(key=lambda s: s["wall_ms"], reverse=True)
+
+    workers = defaultdict(lambda: {"count": 0, "queue_ms": 0.0, "handler_ms": 0.0, "errors": 0})
+    for span in spans:
+        if span["worker"] is None:
+            continue
+        stats = workers[span["worker"]]
+        stats["count"] += 1
+        stats["queue_ms"] += (span["start"] - span["enqueue"]) * 1000
+        stats["handler_ms"] += (span["end"] - span["start"]) * 1000
+        stats["errors"] += span["error"] is not None
+    return {
+        "traces": summary[:top],
+        "workers": {worker: {"count": stats["count"], "errors": stats["errors"],
+                             "avg_queue_ms": stats["queue_ms"] / stats["count"],
+                             "avg_handler_ms": stats["handler_ms"] / stats["count"]}
+                    for worker, stats in workers.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize Citlali message traces")
+    parser.add_argument("path", help="trace file written by CitlaliRuntime.enable_tracing (jsonl or otlp)")
+    parser.add_argument("--top", type=int, default=5, help="number of slowest traces to show")
+    parser.add_argument("--trace", default=None, help="only summarize this trace id")
+    args = parser.parse_args()
+
+    spans = load_spans(args.path)
+    if args.trace is not None:
+        spans = [span for span in spans if span["trace_id"] == args.trace]
+    print(json.dumps(summarize(spans, args.top), indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,139 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+
+from .entity import ResultMessage, ModelUsage
+
+
+def cache_key(model, create_args, messages):
+    # 对模型、调用参数与转换后的消息（含图片 data uri）做稳定哈希
+    payload = json.dumps({"model": model, "create_args": create_args, "messages": messages},
+                         sort_keys=True, ensure_ascii=False, default=repr)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# 两级模型应答缓存：内存 LRU + 磁盘目录（每个 key 一个 JSON 文件，按总大小淘汰最久未访问的条目）。
+# 命中的应答 usage 记为 0 并标记 cached，ttl 为条目的有效秒数，None 表示不过期
+class ResponseCache:
+    def __init__(self, max_entries: int = 256, directory=None, max_disk_bytes: int = 512 * 1024 * 1024,
+                 ttl: float | None = None):
+        self._max_entries = max_entries
+        self._directory = directory
+        self._max_disk_bytes = max_disk_bytes
+        self._ttl = ttl
+        self._memory: OrderedDict[str, dict] = OrderedDict()
+        self._disk_index: dict[str, tuple[int, float]] = dict()  # key -> (文件大小, 最近访问时间)
+        self._disk_bytes = 0
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "expired": 0, "evicted": 0}
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            for entry in os.scandir(directory):
+                if entry.name.endswith(".json"):
+                    stat = entry.stat()
+                    self._disk_index[entry.name[:-5]] = (stat.st_size, stat.st_mtime)
+                    self._disk_bytes += stat.st_size
+            self._evict_disk()
+
+    def _path(self, key):
+        return os.path.join(self._directory, f"{key}.json")
+
+    def _expired(self, record):
+        return self._ttl is not None and time.time() - record["created"] > self._ttl
+
+    async def get(self, key) -> ResultMessage | None:
+        record = self._memory.get(key)
+        if record is not None:
+            if self._expired(record):
+                self._memory.pop(key)
+                self._stats["expired"] += 1
+            else:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return self._to_result(record)
+        if key in self._disk_index:
+            record = await asyncio.to_thread(self._read, key)
+            if record is not None and self._expired(record):
+                self._remove_file(key)
+                self._stats["expired"] += 1
+            elif record is not None:
+                self._disk_index[key] = (self._disk_index[key][0], time.time())
+                self._remember(key, record)
+                self._stats["disk_hits"] += 1
+                return self._to_result(record)
+        self._stats["misses"] += 1
+        return None
+
+    async def put(self, key, result: ResultMessage):
+        record = {
+            "created": time.time(),
+            "finish_reason": result.finish_reason,
+            "content": result.content,
+            "thought": result.thought,
+            "usage": {"prompt_tokens": result.usage.prompt_tokens, "completion_tokens": result.usage.completion_tokens},
+        }
+        self._remember(key, record)
+        if self._directory is not None:
+            size = await asyncio.to_thread(self._write, key, record)
+            self._disk_bytes += size - self._disk_index.get(key, (0, 0))[0]
+            self._disk_index[key] = (size, time.time())
+            self._evict_disk()
+
+    def _remember(self, key, record):
+        self._memory[key] = record
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._max_entries:
+            self._memory.popitem(last=False)
+
+    def _read(self, key):
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, key, record):
+        path = self._path(key)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(record, f, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+        return os.path.getsize(path)
+
+    def _remove_file(self, key):
+        size, _ = self._disk_index.pop(key, (0, 0))
+        self._disk_bytes -= size
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _evict_disk(self):
+        if self._disk_bytes <= self._max_disk_bytes:
+            return
+        for key, _ in sorted(self._disk_index.items(), key=lambda item: item[1][1]):
+            if self._disk_bytes <= self._max_disk_bytes:
+                break
+            self._remove_file(key)
+            self._stats["evicted"] += 1
+
+    @staticmethod
+    def _to_result(record):
+        return ResultMessage(
+            finish_reason=record["finish_reason"],
+            content=record["content"],
+            usage=ModelUsage(prompt_tokens=0, completion_tokens=0),
+            thought=record["thought"],
+            cached=True,
+        )
+
+    def stats(self):
+        lookups = self._stats["memory_hits"] + self._stats["disk_hits"] + self._stats["misses"]
+        return {
+            **self._stats,
+            "hit_rate": (self._stats["memory_hits"] + self._stats["disk_hits"]) / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "disk_entries": len(self._disk_index),
+            "disk_bytes": self._disk_bytes,
+        }
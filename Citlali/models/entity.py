@@ -13,11 +13,14 @@ class ChatMessage:
         ...
 
 class ResultMessage:
-    def __init__(self, finish_reason, content, usage, thought=None):
+    def __init__(self, finish_reason, content, usage, thought=None, cached=False, images=0, request_bytes=0):
         self.finish_reason: str = finish_reason
         self.content: str = content
         self.usage: ModelUsage = usage
         self.thought: Optional[str] = thought
+        self.cached: bool = cached  # 是否由 ResponseCache 直接返回
+        self.images: int = images  # 请求中的图片数
+        self.request_bytes: int = request_bytes  # 请求消息的文本与图片 data URI 字节数
 
     def __str__(self):
         return self.content
@@ -25,4 +28,12 @@ class ResultMessage:
 class ModelUsage:
     def __init__(self, prompt_tokens, completion_tokens):
         self.prompt_tokens: int = prompt_tokens
-        self.completion_tokens: int = completion_tokens
\ No newline at end of file
+        self.completion_tokens: int = completion_tokens
+
+class ChatStream:
+    def __init__(self):
+        self.deltas = None  # 文本增量的异步迭代器，由模型客户端设置
+        self.result: Optional[ResultMessage] = None  # 迭代结束后可用
+
+    def __aiter__(self):
+        return self.deltas.__aiter__()
@@ -1,4 +1,8 @@
 import json
+from typing import Sequence, Mapping, Any
+
+from .entity import ChatMessage, ChatStream
+from ..core.type import MessagePriority
 
 class ChatClient:
 
@@ -13,13 +17,32 @@ class ChatClient:
         else:
             self.model_info = self._get_model_info(kwargs["model"])
 
+    # priority 为请求在准入控制中的排队优先级，None 表示 NORMAL
     async def create(
             self,
-            messages,
-            extra_create_args = {},
+            messages: Sequence[ChatMessage],
+            json_output: bool = False,
+            extra_create_args: Mapping[str, Any] = {},
+            priority: MessagePriority | None = None,
     ):
         ...
 
+    def create_stream(
+            self,
+            messages: Sequence[ChatMessage],
+            json_output: bool = False,
+            extra_create_args: Mapping[str, Any] = {},
+            priority: MessagePriority | None = None,
+    ) -> ChatStream:
+        # 不支持增量输出的客户端在结果返回后将其作为单个增量产出
+        stream = ChatStream()
+
+        async def _deltas():
+            stream.result = await self.create(messages, json_output, extra_create_args, priority)
+            yield stream.result.content
+        stream.deltas = _deltas()
+        return stream
+
     def _get_model_info(self, model_name):
         with open(self.model_infos, 'r') as file:
             # 读取JSON数据
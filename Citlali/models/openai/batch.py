@@ -0,0 +1,232 @@
+import asyncio
+import itertools
+import json
+import os
+import tempfile
+import uuid
+from typing import Sequence, Mapping, Any
+
+from loguru import logger
+from openai import AsyncOpenAI
+
+from ..entity import ChatMessage, ChatStream, ModelUsage, ResultMessage
+from ...core.type import MessagePriority
+from .client import OpenAIChatClient, OPENAI_INIT_KWARGS
+
+
+class BatchRequestError(RuntimeError):
+    pass
+
+
+def _write_jsonl(path, records):
+    with open(path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+def _read_jsonl(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+# 通过 OpenAI Batch API 提交：上传 JSONL、创建 batch，retrieve 在完成前返回 None
+class OpenAIBatchBackend:
+    def __init__(self, client: AsyncOpenAI, completion_window: str = "24h"):
+        self._client = client
+        self._completion_window = completion_window
+
+    async def submit(self, path):
+        with open(path, "rb") as f:
+            input_file = await self._client.files.create(file=f, purpose="batch")
+        batch = await self._client.batches.create(input_file_id=input_file.id, endpoint="/v1/chat/completions",
+                                                  completion_window=self._completion_window)
+        return batch.id
+
+    async def retrieve(self, batch_id):
+        batch = await self._client.batches.retrieve(batch_id)
+        if batch.status in ("validating", "in_progress", "finalizing"):
+            return None
+        if batch.status != "completed":
+            raise BatchRequestError(f"Batch {batch_id} ended with status {batch.status}")
+        records = []
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                content = await self._client.files.content(file_id)
+                records += [json.loads(line) for line in content.text.splitlines() if line.strip()]
+        return records
+
+
+# 本地替身 batch 服务：按 JSONL 逐条调用 responder(body) 并生成与 Batch API 相同格式的输出记录，
+# 用于测试，或在不提供 batch 接口的模型服务上复用批量流程。responder 默认走 client 的普通对话接口
+class LocalBatchBackend:
+    def __init__(self, responder=None, client: AsyncOpenAI | None = None, concurrency: int = 4):
+        if responder is None:
+            if client is None:
+                raise ValueError("LocalBatchBackend requires a responder or a client")
+
+            async def responder(body):
+                return (await client.chat.completions.create(**body)).model_dump()
+        self._responder = responder
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._jobs: dict[str, asyncio.Task] = dict()
+
+    async def submit(self, path):
+        batch_id = f"batch_local_{uuid.uuid4().hex}"
+        self._jobs[batch_id] = asyncio.create_task(self._run(path))
+        return batch_id
+
+    async def retrieve(self, batch_id):
+        if not self._jobs[batch_id].done():
+            return None
+        return self._jobs.pop(batch_id).result()
+
+    async def _run(self, path):
+        requests = await asyncio.to_thread(_read_jsonl, path)
+        return await asyncio.gather(*(self._respond(request) for request in requests))
+
+    async def _respond(self, request):
+        async with self._semaphore:
+            try:
+                body = await self._responder(request["body"])
+            except Exception as e:
+                return {"id": uuid.uuid4().hex, "custom_id": request["custom_id"], "response": None,
+                        "error": {"code": type(e).__name__, "message": str(e)}}
+        return {"id": uuid.uuid4().hex, "custom_id": request["custom_id"],
+                "response": {"status_code": 200, "body": body}, "error": None}
+
+
+# 离线批量模式：与 OpenAIChatClient 相同的 create 接口，请求先攒批写入 JSONL，
+# 达到 batch_size 或等待 flush_interval 秒后整体提交，轮询完成后把结果交还给各个调用方。
+# 复用 chat_client 的参数校验、消息转换与应答缓存
+class BatchChatClient:
+    def __init__(self, chat_client: OpenAIChatClient, backend=None, batch_size: int = 100,
+                 flush_interval: float = 5.0, poll_interval: float = 30.0, work_dir=None):
+        self._chat_client = chat_client
+        self._backend = backend if backend is not None else OpenAIBatchBackend(chat_client._client)
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._poll_interval = poll_interval
+        self._work_dir = work_dir if work_dir is not None else tempfile.mkdtemp(prefix="citlali-batch-")
+        os.makedirs(self._work_dir, exist_ok=True)
+        self.model_info = chat_client.model_info
+
+        self._pending = []  # (custom_id, body, future, cache key)
+        self._flush_handle = None
+        self._batches: set[asyncio.Task] = set()
+        self._next_id = itertools.count()
+
+    async def create(
+            self,
+            messages: Sequence[ChatMessage],
+            json_output: bool = False,
+            extra_create_args: Mapping[str, Any] = {},
+            priority: MessagePriority | None = None,
+    ):
+        create_args, messages, key, _ = await self._chat_client._prepare(messages, json_output, extra_create_args)
+        if key is not None:
+            cached = await self._chat_client._cache.get(key)
+            if cached is not None:
+                return cached
+
+        body = {"messages": messages, **{k: v for k, v in create_args.items() if k not in OPENAI_INIT_KWARGS}}
+        future = asyncio.get_event_loop().create_future()
+        self._pending.append((f"request-{next(self._next_id)}", body, future, key))
+        if len(self._pending) >= self._batch_size:
+            self.flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_event_loop().call_later(self._flush_interval, self.flush)
+        return await future
+
+    def create_stream(
+            self,
+            messages: Sequence[ChatMessage],
+            json_output: bool = False,
+            extra_create_args: Mapping[str, Any] = {},
+            priority: MessagePriority | None = None,
+    ) -> ChatStream:
+        # 批量模式没有增量输出，结果返回后作为单个增量产出
+        stream = ChatStream()
+
+        async def _deltas():
+            stream.result = await self.create(messages, json_output, extra_create_args, priority)
+            yield stream.result.content
+        stream.deltas = _deltas()
+        return stream
+
+    def flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending:
+            return
+        requests, self._pending = self._pending, []
+        task = asyncio.create_task(self._run_batch(requests))
+        self._batches.add(task)
+        task.add_done_callback(self._batches.discard)
+
+    async def close(self):
+        # 提交剩余请求并等待所有 batch 完成
+        self.flush()
+        await asyncio.gather(*self._batches, return_exceptions=True)
+
+    async def _run_batch(self, requests):
+        path = os.path.join(self._work_dir, f"batch-{uuid.uuid4().hex}.jsonl")
+        try:
+            await asyncio.to_thread(_write_jsonl, path, [
+                {"custom_id": custom_id, "method": "POST", "url": "/v1/chat/completions", "body": body}
+                for custom_id, body, _, _ in requests])
+            batch_id = await self._backend.submit(path)
+            logger.info("Submitted batch {} with {} requests", batch_id, len(requests))
+            while (records := await self._backend.retrieve(batch_id)) is None:
+                await asyncio.sleep(self._poll_interval)
+        except Exception as e:
+            logger.error("Batch of {} requests failed: {}", len(requests), e)
+            for _, _, future, _ in requests:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
+        try:
+            records = {record.get("custom_id"): record for record in records}
+            for custom_id, body, future, key in requests:
+                if future.done():
+                    continue
+                # 逐条解析，单条记录格式异常只影响对应的调用方
+                try:
+                    response = self._resolve(custom_id, body, records.get(custom_id))
+                except Exception as e:
+                    future.set_exception(e)
+                    continue
+                future.set_result(response)
+                if key is not None and response.finish_reason == "stop":
+                    await self._chat_client._cache.put(key, response)
+        finally:
+            for custom_id, _, future, _ in requests:
+                if not future.done():
+                    future.set_exception(BatchRequestError(f"Batch request {custom_id} was not resolved"))
+
+    def _resolve(self, custom_id, body, record):
+        if record is None:
+            raise BatchRequestError(f"Batch request {custom_id} failed: missing output")
+        if record.get("error") or record["response"]["status_code"] != 200:
+            error = record.get("error") or record["response"]["body"]
+            raise BatchRequestError(f"Batch request {custom_id} failed: {error}")
+        try:
+            response = self._to_result(record["response"]["body"])
+        except (KeyError, IndexError, TypeError) as e:
+            raise BatchRequestError(f"Batch request {custom_id} returned a malformed body: {e!r}") from e
+        response.images, response.request_bytes = self._chat_client._request_size(body["messages"])
+        return response
+
+    @staticmethod
+    def _to_result(body):
+        choice = body["choices"][0]
+        usage = body.get("usage") or {}
+        return ResultMessage(
+            finish_reason=choice["finish_reason"],
+            content=choice["message"]["content"] or "",
+            usage=ModelUsage(prompt_tokens=usage.get("prompt_tokens", 0),
+                             completion_tokens=usage.get("completion_tokens", 0)),
+        )
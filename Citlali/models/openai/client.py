@@ -1,17 +1,31 @@
 import asyncio
+import contextlib
 import inspect
+import itertools
 import os
+import random
 from typing import List, Sequence, Mapping, Any, cast
 
-from openai import AsyncOpenAI
+from openai import AsyncOpenAI, RateLimitError, APIConnectionError, InternalServerError
 from openai.types.chat import ChatCompletionSystemMessageParam, ChatCompletionUserMessageParam, \
     ChatCompletionContentPartImageParam, ChatCompletionContentPartTextParam
 from openai.types.chat.chat_completion_content_part_image_param import ImageURL
 
-from ..entity import ChatMessage, ModelUsage, ResultMessage
+from ..cache import ResponseCache, cache_key
+from ..rate_limiter import AdmissionController
+from ...core.type import MessagePriority
+from ..entity import ChatMessage, ModelUsage, ResultMessage, ChatStream
 from ..model_client import ChatClient
 from ...utils.image import Image
 
+# 配置 limiter 时 SDK 不再自动重试，连接错误、超时与 5xx 由准入循环按抖动指数退避重试
+_TRANSIENT_ERRORS = (APIConnectionError, InternalServerError)
+_BACKOFF = 0.5
+_MAX_BACKOFF = 30
+
+# AsyncOpenAI 构造参数（api_key、base_url 等），用于从 create_args 中分离客户端配置与请求参数
+OPENAI_INIT_KWARGS = frozenset(inspect.getfullargspec(AsyncOpenAI.__init__).kwonlyargs)
+
 
 class OpenAIChatMessage(ChatMessage):
     def convert(self):
@@ -55,23 +69,73 @@ class OpenAIChatMessage(ChatMessage):
 
 class OpenAIChatClient(ChatClient):
 
-    def __init__(self, create_args):
+    def __init__(self, create_args, cache: ResponseCache | None = None, limiter: AdmissionController | None = None):
         super().__init__(os.path.dirname(__file__)+"/model_info.json", **create_args)
-        self._client = self._init_client(create_args)
+        self._client = self._init_client(create_args, limiter is not None)
         self._create_args = create_args
+        self._cache = cache
+        self._limiter = limiter
+
+    def cache_stats(self):
+        return self._cache.stats() if self._cache is not None else None
+
+    def limiter_stats(self):
+        return self._limiter.stats() if self._limiter is not None else None
 
     @staticmethod
-    def _init_client(create_args):
-        openai_init_kwargs = set(inspect.getfullargspec(AsyncOpenAI.__init__).kwonlyargs)
-        openai_config = {k: v for k, v in create_args.items() if k in openai_init_kwargs}
+    def _init_client(create_args, limited=False):
+        openai_config = {k: v for k, v in create_args.items() if k in OPENAI_INIT_KWARGS}
+        if limited:
+            # 429 重试交给 AdmissionController 统一调度，避免 SDK 各自重试形成重试风暴
+            openai_config.setdefault("max_retries", 0)
         return AsyncOpenAI(**openai_config)
 
-    async def create(
-            self,
-            messages: Sequence[ChatMessage],
-            json_output: bool = False,
-            extra_create_args: Mapping[str, Any] = {},
-    ):
+    def _admit(self, priority, estimated_tokens):
+        if self._limiter is None:
+            return contextlib.nullcontext()
+        return self._limiter.admit(priority if priority is not None else MessagePriority.NORMAL, estimated_tokens)
+
+    def _on_rate_limited(self, ticket, error: RateLimitError, attempt):
+        if ticket is None or attempt >= self._limiter.max_retries:
+            raise error
+        retry_after = error.response.headers.get("retry-after") if error.response is not None else None
+        try:
+            retry_after = float(retry_after) if retry_after is not None else None
+        except ValueError:
+            retry_after = None
+        ticket.record_rate_limited(retry_after)
+
+    def _transient_delay(self, error, attempt):
+        if self._limiter is None or attempt >= self._limiter.max_retries:
+            raise error
+        return random.uniform(0, min(_MAX_BACKOFF, _BACKOFF * 2 ** attempt))
+
+    @staticmethod
+    def _estimate_tokens(messages, create_args):
+        # 粗略预估用于 Token 令牌桶：文本约 4 字符 1 个 token，图片按 765 计，完成后按实际用量结算
+        tokens = 0
+        for message in messages:
+            for item in message.content if isinstance(message.content, list) else [message.content]:
+                tokens += 765 if isinstance(item, Image) else len(item) // 4
+        return tokens + create_args.get("max_tokens", 512)
+
+    @staticmethod
+    def _request_size(messages):
+        # 统计转换后消息中的图片数与字节数，图片按 data URI 长度计
+        images, request_bytes = 0, 0
+        for message in messages:
+            content = message["content"]
+            for part in content if isinstance(content, list) else [content]:
+                if isinstance(part, str):
+                    request_bytes += len(part.encode("utf-8"))
+                elif part["type"] == "image_url":
+                    images += 1
+                    request_bytes += len(part["image_url"]["url"])
+                else:
+                    request_bytes += len(part["text"].encode("utf-8"))
+        return images, request_bytes
+
+    async def _prepare(self, messages, json_output, extra_create_args):
         create_args = self._create_args.copy()
         create_args.update(extra_create_args)
 
@@ -88,18 +152,57 @@ class OpenAIChatClient(ChatClient):
         else:
             create_args["response_format"] = {"type": "json_object"} if json_output else {"type": "text"}
 
-        # 转换消息
-        messages = [OpenAIChatMessage.convert(message) for message in messages]
+        estimated_tokens = self._estimate_tokens(messages, create_args) if self._limiter is not None else 0
 
-        # 创建对话
-        future = asyncio.ensure_future(
-            self._client.chat.completions.create(
-                messages=messages,
-                stream=False,
-                **create_args)
-        )
+        # 转换消息，图片的 PNG 编码与 base64 转换较慢，含图片时在线程池中执行
+        if any(isinstance(message.content, list) and any(isinstance(x, Image) for x in message.content)
+               for message in messages):
+            messages = await asyncio.to_thread(lambda: [OpenAIChatMessage.convert(message) for message in messages])
+        else:
+            messages = [OpenAIChatMessage.convert(message) for message in messages]
 
-        result = await future
+        # 缓存 key，客户端连接参数（api_key、base_url 等）不参与计算
+        key = None
+        if self._cache is not None:
+                key = cache_key(create_args.get("model"),
+                            {k: v for k, v in create_args.items() if k not in OPENAI_INIT_KWARGS}, messages)
+        return create_args, messages, key, estimated_tokens
+
+    async def create(
+            self,
+            messages: Sequence[ChatMessage],
+            json_output: bool = False,
+            extra_create_args: Mapping[str, Any] = {},
+            priority: MessagePriority | None = None,
+    ):
+        create_args, messages, key, estimated_tokens = await self._prepare(messages, json_output, extra_create_args)
+        if key is not None:
+            cached = await self._cache.get(key)
+            if cached is not None:
+                return cached
+
+        # 创建对话，配置了 limiter 时经准入控制排队，429 时重新排队重试，临时性错误退避后重试
+        for attempt in itertools.count():
+            async with self._admit(priority, estimated_tokens) as ticket:
+                future = asyncio.ensure_future(
+                    self._client.chat.completions.create(
+                        messages=messages,
+                        stream=False,
+                        **create_args)
+                )
+                try:
+                    result = await future
+                except RateLimitError as e:
+                    self._on_rate_limited(ticket, e, attempt)
+                    continue
+                except _TRANSIENT_ERRORS as e:
+                    delay = self._transient_delay(e, attempt)
+                else:
+                    if ticket is not None and result.usage is not None:
+                        ticket.record_usage(result.usage.total_tokens)
+                    break
+            # 退避期间不占用并发名额
+            await asyncio.sleep(delay)
 
         # 获取Token用量信息
         usage = ModelUsage(
@@ -109,12 +212,85 @@ class OpenAIChatClient(ChatClient):
 
         # 构建ResultMessage响应
         choice = result.choices[0]
+        images, request_bytes = self._request_size(messages)
         response = ResultMessage(
             finish_reason = choice.finish_reason,
             content = choice.message.content or "",
             usage=usage,
+            images=images,
+            request_bytes=request_bytes,
         )
 
+        if key is not None and choice.finish_reason == "stop":
+            await self._cache.put(key, response)
+
         return response
 
+    def create_stream(
+            self,
+            messages: Sequence[ChatMessage],
+            json_output: bool = False,
+            extra_create_args: Mapping[str, Any] = {},
+            priority: MessagePriority | None = None,
+    ) -> ChatStream:
+        # 流式对话：async for 逐个读取文本增量，迭代结束后 stream.result 为完整的 ResultMessage
+        stream = ChatStream()
+        stream.deltas = self._stream(stream, messages, json_output, extra_create_args, priority)
+        return stream
+
+    async def _stream(self, stream: ChatStream, messages, json_output, extra_create_args, priority):
+        create_args, messages, key, estimated_tokens = await self._prepare(messages, json_output, extra_create_args)
+        if key is not None:
+            cached = await self._cache.get(key)
+            if cached is not None:
+                stream.result = cached
+                yield cached.content
+                return
+
+        content = []
+        finish_reason = None
+        usage = ModelUsage(prompt_tokens=0, completion_tokens=0)
+        for attempt in itertools.count():
+            # 整个流式读取期间占用一个并发名额
+            async with self._admit(priority, estimated_tokens) as ticket:
+                try:
+                    chunks = await self._client.chat.completions.create(
+                        messages=messages,
+                        stream=True,
+                        stream_options={"include_usage": True},
+                        **create_args)
+                except RateLimitError as e:
+                    self._on_rate_limited(ticket, e, attempt)
+                    continue
+                except _TRANSIENT_ERRORS as e:
+                    # 仅在建立流之前重试，已产出的增量无法撤回
+                    delay = self._transient_delay(e, attempt)
+                else:
+                    async for chunk in chunks:
+                        # 最后一个 chunk 只携带 usage，choices 为空
+                        if chunk.usage is not None:
+                            usage = ModelUsage(prompt_tokens=chunk.usage.prompt_tokens,
+                                               completion_tokens=chunk.usage.completion_tokens)
+                        if not chunk.choices:
+                            continue
+                        choice = chunk.choices[0]
+                        if choice.finish_reason is not None:
+                            finish_reason = choice.finish_reason
+                        if choice.delta.content:
+                            content.append(choice.delta.content)
+                            yield choice.delta.content
+                    if ticket is not None:
+                        ticket.record_usage(usage.prompt_tokens + usage.completion_tokens)
+                    break
+            await asyncio.sleep(delay)
 
+        images, request_bytes = self._request_size(messages)
+        stream.result = ResultMessage(
+            finish_reason=finish_reason,
+            content="".join(content),
+            usage=usage,
+            images=images,
+            request_bytes=request_bytes,
+        )
+        if key is not None and finish_reason == "stop":
+            await self._cache.put(key, stream.result)
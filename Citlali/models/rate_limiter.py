@@ -0,0 +1,160 @@
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from contextlib import asynccontextmanager
+
+from loguru import logger
+
+from ..core.type import MessagePriority
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float, burst: float | None = None):
+        self._rate = per_minute / 60
+        self._capacity = burst if burst is not None else per_minute
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def delay(self, amount):
+        # 取得 amount 个令牌还需等待的秒数；单次请求超过桶容量时按装满计算，避免永久等待
+        self._refill()
+        return max(min(amount, self._capacity) - self._tokens, 0) / self._rate
+
+    def consume(self, amount):
+        # 允许透支，实际用量与预估的差额在这里结算
+        self._refill()
+        self._tokens -= amount
+
+
+class _Ticket:
+    def __init__(self, controller, estimated_tokens):
+        self._controller = controller
+        self.estimated_tokens = estimated_tokens
+        self.start = time.monotonic()
+        self.rate_limited = False
+
+    def record_usage(self, tokens):
+        if self._controller._token_bucket is not None:
+            self._controller._token_bucket.consume(tokens - self.estimated_tokens)
+
+    def record_rate_limited(self, retry_after: float | None = None):
+        self.rate_limited = True
+        self._controller._on_rate_limited(retry_after)
+
+
+# 模型调用的准入控制：请求数/Token 数的令牌桶、AIMD 自适应并发上限，以及按 MessagePriority 分道排队。
+# 收到 429 或延迟超过 latency_target 时并发上限减半，正常完成时缓慢增加
+class AdmissionController:
+    def __init__(self, requests_per_minute: float | None = None, tokens_per_minute: float | None = None,
+                 max_concurrency: int = 16, min_concurrency: int = 1, latency_target: float | None = None,
+                 max_retries: int = 5):
+        self._request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self._token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._max_concurrency = max_concurrency
+        self._min_concurrency = min_concurrency
+        self._latency_target = latency_target
+        self.max_retries = max_retries
+
+        self._limit = float(max_concurrency)
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._waiters = []  # (priority, 序号, future)
+        self._sequence = itertools.count()
+        self._wakeup = None
+        self._last_decrease = 0.0
+        self._stats = {"admitted": 0, "rate_limited": 0, "decreases": 0}
+
+    @asynccontextmanager
+    async def admit(self, priority: MessagePriority = MessagePriority.NORMAL, estimated_tokens: int = 0):
+        await self._acquire(priority, estimated_tokens)
+        ticket = _Ticket(self, estimated_tokens)
+        try:
+            yield ticket
+        finally:
+            self._in_flight -= 1
+            if not ticket.rate_limited:
+                self._on_completed(time.monotonic() - ticket.start)
+            self._dispatch()
+
+    async def _acquire(self, priority, estimated_tokens):
+        future = asyncio.get_event_loop().create_future()
+        heapq.heappush(self._waiters, (priority.value, next(self._sequence), future, estimated_tokens))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # 已获准入但调用方被取消，归还并发名额
+                self._in_flight -= 1
+                self._dispatch()
+            raise
+
+    def _dispatch(self):
+        # 按优先级依次放行：并发名额、暂停期、请求与 Token 令牌桶均满足时才准入
+        while self._waiters:
+            if self._waiters[0][2].done():
+                heapq.heappop(self._waiters)
+                continue
+            if self._in_flight >= int(self._limit):
+                return
+            delay = max(self._paused_until - time.monotonic(), 0)
+            estimated_tokens = self._waiters[0][3]
+            if self._request_bucket is not None:
+                delay = max(delay, self._request_bucket.delay(1))
+            if self._token_bucket is not None:
+                delay = max(delay, self._token_bucket.delay(estimated_tokens))
+            if delay > 0:
+                self._schedule_wakeup(delay)
+                return
+            _, _, future, _ = heapq.heappop(self._waiters)
+            if self._request_bucket is not None:
+                self._request_bucket.consume(1)
+            if self._token_bucket is not None:
+                self._token_bucket.consume(estimated_tokens)
+            self._in_flight += 1
+            self._stats["admitted"] += 1
+            future.set_result(None)
+
+    def _schedule_wakeup(self, delay):
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+        self._wakeup = asyncio.get_event_loop().call_later(delay, self._dispatch)
+
+    def _on_completed(self, latency):
+        if self._latency_target is not None and latency > self._latency_target:
+            self._decrease()
+        else:
+            # 加性增：每完成约 limit 个请求增加 1
+            self._limit = min(self._max_concurrency, self._limit + 1 / self._limit)
+
+    def _on_rate_limited(self, retry_after):
+        self._stats["rate_limited"] += 1
+        self._decrease()
+        backoff = retry_after if retry_after is not None else random.uniform(0.5, 1.5)
+        self._paused_until = max(self._paused_until, time.monotonic() + backoff)
+        logger.warning("Model provider rate limited, concurrency limit {} and pausing {:.1f}s",
+                       int(self._limit), backoff)
+
+    def _decrease(self):
+        # 同一时刻的多个 429 只减半一次
+        now = time.monotonic()
+        if now - self._last_decrease < 1.0:
+            return
+        self._last_decrease = now
+        self._limit = max(self._min_concurrency, self._limit / 2)
+        self._stats["decreases"] += 1
+
+    def stats(self):
+        return {
+            **self._stats,
+            "concurrency_limit": int(self._limit),
+            "in_flight": self._in_flight,
+            "waiting": sum(not waiter[2].done() for waiter in self._waiters),
+        }
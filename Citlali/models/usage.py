@@ -0,0 +1,149 @@
+import asyncio
+import json
+import statistics
+from collections import deque
+
+from loguru import logger
+
+from .entity import ResultMessage
+
+
+def _write_json(path, data):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+
+
+class UsageStats:
+    _COUNTERS = ("requests", "cached", "errors", "prompt_tokens", "completion_tokens", "images", "request_bytes")
+
+    def __init__(self, max_samples: int = 1024):
+        self.requests = 0
+        self.cached = 0  # ResponseCache 命中，usage 为 0 且不计入延迟分位数
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.images = 0
+        self.request_bytes = 0
+        self.latencies = deque(maxlen=max_samples)  # 最近 max_samples 次实际请求的延迟（秒）
+
+    def add(self, response: ResultMessage, latency):
+        self.requests += 1
+        if response.cached:
+            self.cached += 1
+            return
+        self.prompt_tokens += response.usage.prompt_tokens
+        self.completion_tokens += response.usage.completion_tokens
+        self.images += response.images
+        self.request_bytes += response.request_bytes
+        self.latencies.append(latency)
+
+    def merge(self, other: "UsageStats"):
+        self.requests += other.requests
+        self.cached += other.cached
+        self.errors += other.errors
+        self.prompt_tokens += other.prompt_tokens
+        self.completion_tokens += other.completion_tokens
+        self.images += other.images
+        self.request_bytes += other.request_bytes
+        self.latencies.extend(other.latencies)
+
+    def export(self):
+        # 由基础类型构成的原始计数，可经任意 IPC codec 传递后由 load 还原
+        return {**{name: getattr(self, name) for name in self._COUNTERS}, "latencies": list(self.latencies)}
+
+    @classmethod
+    def load(cls, data):
+        stats = cls(max_samples=None)
+        for name in cls._COUNTERS:
+            setattr(stats, name, data[name])
+        stats.latencies.extend(data["latencies"])
+        return stats
+
+    def to_dict(self):
+        latencies = sorted(self.latencies)
+
+        def _at(q):
+            return latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000 if latencies else 0.0
+        return {
+            "requests": self.requests,
+            "cached": self.cached,
+            "errors": self.errors,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.prompt_tokens + self.completion_tokens,
+            "images": self.images,
+            "request_bytes": self.request_bytes,
+            "mean_latency_ms": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+            "p50_latency_ms": _at(0.50),
+            "p90_latency_ms": _at(0.90),
+            "p99_latency_ms": _at(0.99),
+        }
+
+
+# 模型调用的用量登记：按 (agent, prompt_kind) 累计 Token、延迟、图片数与请求字节数，
+# 可按 agent 或 prompt_kind 汇总查询，也可由 start_dump 周期性写出 JSON
+class UsageRegistry:
+    def __init__(self, max_samples: int = 1024):
+        self._max_samples = max_samples
+        self._stats: dict[tuple[str, str], UsageStats] = dict()
+        self._dump_task = None
+
+    def _get(self, agent, prompt_kind):
+        return self._stats.setdefault((agent, prompt_kind), UsageStats(self._max_samples))
+
+    def record(self, agent, prompt_kind, response: ResultMessage, latency):
+        self._get(agent, prompt_kind).add(response, latency)
+
+    def record_error(self, agent, prompt_kind):
+        self._get(agent, prompt_kind).errors += 1
+
+    def drain(self):
+        # 取出并清空已有记录，子进程以此把用量回送给父进程
+        entries = [{"agent": agent, "prompt_kind": kind, **stats.export()} for (agent, kind), stats in self._stats.items()]
+        self._stats.clear()
+        return entries
+
+    def absorb(self, entries):
+        for entry in entries:
+            self._get(entry["agent"], entry["prompt_kind"]).merge(UsageStats.load(entry))
+
+    def query(self, agent=None, prompt_kind=None):
+        # 汇总满足条件的条目，参数为 None 表示不过滤
+        total = UsageStats(max_samples=None)
+        for (entry_agent, entry_kind), stats in self._stats.items():
+            if (agent is None or entry_agent == agent) and (prompt_kind is None or entry_kind == prompt_kind):
+                total.merge(stats)
+        return total.to_dict()
+
+    def stats(self):
+        return {
+            "total": self.query(),
+            "agents": {agent: self.query(agent=agent) for agent in {agent for agent, _ in self._stats}},
+            "prompt_kinds": {kind: self.query(prompt_kind=kind) for kind in {kind for _, kind in self._stats}},
+            "entries": {f"{agent}/{kind}": stats.to_dict() for (agent, kind), stats in self._stats.items()},
+        }
+
+    def dump(self, path):
+        _write_json(path, self.stats())
+
+    def start_dump(self, path, interval: float = 60.0):
+        self.stop_dump()
+        self._dump_task = asyncio.create_task(self._dump_periodically(path, interval))
+
+    @property
+    def dumping(self):
+        return self._dump_task is not None and not self._dump_task.done()
+
+    def stop_dump(self):
+        if self._dump_task is not None:
+            self._dump_task.cancel()
+            self._dump_task = None
+
+    async def _dump_periodically(self, path, interval):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                # 在事件循环中取快照，写文件放到线程中
+                await asyncio.to_thread(_write_json, path, self.stats())
+            except OSError as e:
+                logger.error("Failed to dump model usage to {}: {}", path, e)
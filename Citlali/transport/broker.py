@@ -0,0 +1,277 @@
+import argparse
+import asyncio
+import hashlib
+import hmac
+import secrets
+
+from loguru import logger
+
+from .codec import get_codec
+from .connection import Connection, ConnectionClosedError, is_local_address, open_connection, start_server
+from .process import RemotePeer, RemoteWorker, handle_listen, encode_error
+
+_CHALLENGE_SIZE = 32
+
+
+def _sign(token: str | None, challenge: bytes) -> bytes:
+    return hmac.new((token or "").encode(), challenge, hashlib.sha256).digest()
+
+
+# 多节点部署时的中转进程：维护 Worker 所在节点，并在节点之间转发 listen/result/cancel 帧。
+# 消息体在节点侧已序列化为 bytes，Broker 只读取路由字段。
+# 节点连接后先对原始字节做 HMAC 挑战应答校验 token，通过前不经 codec 反序列化任何内容。
+class Broker:
+    def __init__(self, address: str = "tcp://127.0.0.1:7600", codec: str = "pickle", token: str | None = None):
+        if codec == "pickle" and token is None and not is_local_address(address):
+            raise ValueError("The pickle codec on a non-loopback address requires a token")
+        self._address = address
+        self._codec = get_codec(codec)
+        self._token = token
+        self._server = None
+        self._nodes: dict[str, Connection] = dict()
+        self._workers: dict[str, tuple[str, list]] = dict()  # worker_name -> (node_id, channels)
+        self._routes: dict[tuple[str, int], tuple[str, int]] = dict()  # (目标节点, broker rid) -> (来源节点, rid)
+        self._reverse_routes: dict[tuple[str, int], tuple[str, int]] = dict()
+        self._next_rid = 0
+
+    async def start(self):
+        self._server = await start_server(self._address, self._on_connect)
+        logger.info("Citlali broker listening on {}", self._address)
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def stop(self):
+        for connection in list(self._nodes.values()):
+            await connection.close()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _on_connect(self, reader, writer):
+        connection = Connection(reader, writer, self._codec)
+        challenge = secrets.token_bytes(_CHALLENGE_SIZE)
+        try:
+            await connection.send_bytes(challenge)
+            response = await connection.recv_bytes(limit=hashlib.sha256().digest_size)
+            if self._token is not None and not hmac.compare_digest(response, _sign(self._token, challenge)):
+                logger.error("Rejected node connection with invalid token")
+                await connection.close()
+                return
+            frame = await connection.recv()
+        except ConnectionError as e:
+            logger.error("Rejected node connection with invalid handshake: {}", e)
+            await connection.close()
+            return
+        if frame.get("op") != "hello":
+            logger.error("Rejected node connection with invalid handshake")
+            await connection.close()
+            return
+
+        node_id = secrets.token_hex(8)
+        await connection.send({"op": "workers", "workers": [
+            {"name": name, "channels": channels} for name, (_, channels) in self._workers.items()]})
+        self._nodes[node_id] = connection
+        for worker in frame["workers"]:
+            await self._add_worker(node_id, worker)
+
+        try:
+            while True:
+                frame = await connection.recv()
+                match frame["op"]:
+                    case "worker_added":
+                        await self._add_worker(node_id, frame)
+                    case "listen":
+                        await self._route_listen(node_id, frame)
+                    case "chunk":
+                        await self._route_chunk(node_id, frame)
+                    case "result":
+                        await self._route_result(node_id, frame)
+                    case "cancel":
+                        await self._route_cancel(node_id, frame)
+        except ConnectionClosedError:
+            logger.warning("Node {} disconnected", node_id)
+        finally:
+            await self._remove_node(node_id)
+
+    async def _broadcast(self, frame, exclude=None):
+        for node_id, connection in list(self._nodes.items()):
+            if node_id != exclude:
+                try:
+                    await connection.send(frame)
+                except ConnectionError:
+                    pass
+
+    async def _add_worker(self, node_id, worker):
+        if worker["name"] in self._workers:
+            logger.error("Worker {} is already registered by another node", worker["name"])
+            return
+        self._workers[worker["name"]] = (node_id, worker["channels"])
+        await self._broadcast({"op": "worker_added", "name": worker["name"], "channels": worker["channels"]},
+                              exclude=node_id)
+
+    async def _send(self, node_id, frame):
+        # 目标节点可能正在断开，发送失败不应影响来源节点的读循环
+        connection = self._nodes.get(node_id)
+        if connection is None:
+            return False
+        try:
+            await connection.send(frame)
+        except ConnectionError:
+            logger.warning("Failed to send {} frame to node {}", frame["op"], node_id)
+            return False
+        return True
+
+    async def _route_listen(self, node_id, frame):
+        target = self._workers.get(frame["worker"])
+        if target is None or target[0] not in self._nodes:
+            await self._send(node_id, {"op": "result", "rid": frame["rid"],
+                                       **encode_error(LookupError(f"Worker {frame['worker']} not found"))})
+            return
+        rid = self._next_rid
+        self._next_rid += 1
+        self._routes[(target[0], rid)] = (node_id, frame["rid"])
+        self._reverse_routes[(node_id, frame["rid"])] = (target[0], rid)
+        if not await self._send(target[0], {**frame, "rid": rid}):
+            # 转发失败时撤销路由并以错误结束该请求
+            self._routes.pop((target[0], rid), None)
+            self._reverse_routes.pop((node_id, frame["rid"]), None)
+            await self._send(node_id, {"op": "result", "rid": frame["rid"], **encode_error(
+                ConnectionError("Node of the callee is unreachable"))})
+
+    async def _route_chunk(self, node_id, frame):
+        source = self._routes.get((node_id, frame["rid"]))
+        if source is not None:
+            await self._send(source[0], {**frame, "rid": source[1]})
+
+    async def _route_result(self, node_id, frame):
+        source = self._routes.pop((node_id, frame["rid"]), None)
+        if source is None:
+            return
+        self._reverse_routes.pop(source, None)
+        await self._send(source[0], {**frame, "rid": source[1]})
+
+    async def _route_cancel(self, node_id, frame):
+        target = self._reverse_routes.pop((node_id, frame["rid"]), None)
+        if target is None:
+            return
+        self._routes.pop(target, None)
+        await self._send(target[0], {"op": "cancel", "rid": target[1]})
+
+    async def _remove_node(self, node_id):
+        self._nodes.pop(node_id, None)
+        for name in [name for name, (owner, _) in self._workers.items() if owner == node_id]:
+            self._workers.pop(name)
+            await self._broadcast({"op": "worker_removed", "name": name})
+        # 发往该节点且未完成的请求以错误结束，由该节点发出的请求则通知对端取消
+        for (target, rid), (source, source_rid) in list(self._routes.items()):
+            if target == node_id:
+                self._routes.pop((target, rid), None)
+                self._reverse_routes.pop((source, source_rid), None)
+                await self._send(source, {"op": "result", "rid": source_rid, **encode_error(
+                    ConnectionError("Node of the callee has disconnected"))})
+            elif source == node_id:
+                self._routes.pop((target, rid), None)
+                self._reverse_routes.pop((source, source_rid), None)
+                await self._send(target, {"op": "cancel", "rid": rid})
+
+
+# 节点侧的 Broker 连接：向 Broker 公布本地 Worker，并把其他节点的 Worker 注册为本地代理
+class BrokerClient:
+    def __init__(self, runtime, address: str, codec: str = "pickle", token: str | None = None):
+        self._runtime = runtime
+        self._address = address
+        self._codec = get_codec(codec)
+        self._token = token
+        self._peer: RemotePeer | None = None
+        self._serve_task = None
+        self._tasks: dict[int, asyncio.Task] = dict()
+
+    def owns(self, worker):
+        return isinstance(worker, RemoteWorker) and worker.peer is self._peer
+
+    async def connect(self):
+        connection = await open_connection(self._address, self._codec, opaque_payload=True)
+        self._peer = RemotePeer(connection)
+        challenge = await connection.recv_bytes(limit=_CHALLENGE_SIZE)
+        await connection.send_bytes(_sign(self._token, challenge))
+        await connection.send({"op": "hello", "workers": [
+            self._describe(worker) for worker in self._runtime.workers.list_workers() if not self.owns(worker)]})
+        frame = await connection.recv()
+        for worker in frame["workers"]:
+            self._add_remote_worker(worker)
+        self._serve_task = asyncio.create_task(self._serve())
+
+    def announce(self, worker):
+        asyncio.create_task(self._peer.connection.send({"op": "worker_added", **self._describe(worker)}))
+
+    async def close(self):
+        if self._serve_task is not None:
+            self._serve_task.cancel()
+        if self._peer is not None:
+            self._peer.close()
+            await self._peer.connection.close()
+
+    @staticmethod
+    def _describe(worker):
+        return {"name": worker.name, "channels": list(worker.get_notify_channel())}
+
+    def _add_remote_worker(self, worker):
+        # 同名的本地 Worker 优先，不被其他节点的代理覆盖
+        if self._runtime.workers.has_worker(worker["name"]) and \
+                not self.owns(self._runtime.workers.get_worker(worker["name"])):
+            logger.error("Worker {} on another node conflicts with a local worker and is ignored", worker["name"])
+            return
+        remote_worker = RemoteWorker(worker["name"], self._peer, worker["channels"])
+        self._runtime.register(lambda: remote_worker)
+
+    def _remove_remote_worker(self, worker_name):
+        worker = self._runtime.workers.get_worker(worker_name)
+        if self.owns(worker):
+            self._runtime.workers.unregister(worker_name)
+            self._runtime.message_manager.unsubscribe(worker_name)
+
+    async def _serve(self):
+        connection = self._peer.connection
+        try:
+            while True:
+                frame = await connection.recv()
+                match frame["op"]:
+                    case "listen":
+                        worker = self._runtime.workers.get_worker(frame["worker"])
+                        self._tasks[frame["rid"]] = asyncio.create_task(
+                            handle_listen(worker, frame, connection, self._tasks))
+                    case "cancel":
+                        if frame["rid"] in self._tasks:
+                            self._tasks[frame["rid"]].cancel()
+                    case "chunk":
+                        self._peer.on_chunk(frame)
+                    case "result":
+                        self._peer.on_result(frame)
+                    case "worker_added":
+                        self._add_remote_worker(frame)
+                    case "worker_removed":
+                        self._remove_remote_worker(frame["name"])
+        except ConnectionClosedError:
+            logger.warning("Disconnected from broker {}", self._address)
+        finally:
+            self._peer.close()
+            for task in list(self._tasks.values()):
+                task.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Citlali message broker")
+    parser.add_argument("--address", default="tcp://127.0.0.1:7600",
+                        help="tcp://host:port or unix:///path/to/socket")
+    parser.add_argument("--codec", default="pickle", choices=["pickle", "msgpack"])
+    parser.add_argument("--token", default=None, help="shared secret required from connecting nodes")
+    args = parser.parse_args()
+    asyncio.run(Broker(args.address, args.codec, args.token).serve_forever())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+import pickle
+
+
+class PickleCodec:
+    name = "pickle"
+
+    @staticmethod
+    def dumps(obj) -> bytes:
+        return pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def loads(data: bytes):
+        return pickle.loads(data)
+
+
+class MsgpackCodec:
+    # 仅支持由基础类型（dict/list/str/int/float/bytes/None）构成的消息
+    name = "msgpack"
+
+    def __init__(self):
+        try:
+            import msgpack
+        except ImportError:
+            raise ImportError("msgpack is required for MsgpackCodec, please install it with `pip install msgpack`") from None
+        self._msgpack = msgpack
+
+    def dumps(self, obj) -> bytes:
+        return self._msgpack.packb(obj, use_bin_type=True)
+
+    def loads(self, data: bytes):
+        return self._msgpack.unpackb(data, raw=False)
+
+
+def get_codec(name: str):
+    match name:
+        case "pickle":
+            return PickleCodec()
+        case "msgpack":
+            return MsgpackCodec()
+        case _:
+            raise ValueError(f"Unsupported codec: {name}")
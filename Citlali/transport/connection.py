@@ -0,0 +1,90 @@
+import asyncio
+import ipaddress
+import struct
+
+_HEADER = struct.Struct(">I")
+
+
+class ConnectionClosedError(ConnectionError):
+    pass
+
+
+def parse_address(address: str):
+    # tcp://host:port 或 unix:///path/to/socket
+    if address.startswith("unix://"):
+        return "unix", address[len("unix://"):]
+    if address.startswith("tcp://"):
+        host, _, port = address[len("tcp://"):].rpartition(":")
+        return "tcp", (host, int(port))
+    raise ValueError(f"Unsupported address: {address}")
+
+def is_local_address(address: str):
+    # unix socket 与回环地址只接受本机连接
+    scheme, target = parse_address(address)
+    if scheme == "unix" or target[0] == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(target[0]).is_loopback
+    except ValueError:
+        return False
+
+async def open_connection(address: str, codec, opaque_payload: bool = False):
+    scheme, target = parse_address(address)
+    match scheme:
+        case "unix":
+            reader, writer = await asyncio.open_unix_connection(target)
+        case _:
+            reader, writer = await asyncio.open_connection(*target)
+    return Connection(reader, writer, codec, opaque_payload)
+
+async def start_server(address: str, handler):
+    scheme, target = parse_address(address)
+    match scheme:
+        case "unix":
+            return await asyncio.start_unix_server(handler, target)
+        case _:
+            return await asyncio.start_server(handler, *target)
+
+# 基于 asyncio stream 的定长头分帧连接，每帧为一个经 codec 序列化的 dict
+class Connection:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, codec, opaque_payload: bool = False):
+        self._reader = reader
+        self._writer = writer
+        self._codec = codec
+        # 经 Broker 中转时消息体预先序列化为 bytes，Broker 无需加载业务消息类型
+        self._opaque_payload = opaque_payload
+
+    def pack_message(self, message):
+        return self._codec.dumps(message) if self._opaque_payload else message
+
+    def unpack_message(self, data):
+        return self._codec.loads(data) if self._opaque_payload else data
+
+    async def send(self, frame: dict):
+        await self.send_bytes(self._codec.dumps(frame))
+
+    async def recv(self) -> dict:
+        return self._codec.loads(await self.recv_bytes())
+
+    async def send_bytes(self, payload: bytes):
+        # 头与负载一次写入，避免多个任务并发发送时帧交错
+        self._writer.write(_HEADER.pack(len(payload)) + payload)
+        await self._writer.drain()
+
+    async def recv_bytes(self, limit: int | None = None) -> bytes:
+        # 读取未经 codec 解码的原始帧，limit 用于握手阶段限制对端可写入的长度
+        try:
+            header = await self._reader.readexactly(_HEADER.size)
+            size = _HEADER.unpack(header)[0]
+            if limit is not None and size > limit:
+                raise ConnectionClosedError(f"Frame of {size} bytes exceeds the limit of {limit} bytes")
+            return await self._reader.readexactly(size)
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            raise ConnectionClosedError("Connection closed by peer") from None
+
+    async def close(self):
+        self._writer.close()
+        try:
+            await self._writer.wait_closed()
+        except ConnectionError:
+            pass
@@ -0,0 +1,481 @@
+import asyncio
+import inspect
+import multiprocessing
+import secrets
+from datetime import datetime
+
+from loguru import logger
+
+from ..core.executor import ListenerExecutor
+from ..core.profiler import ListenerProfiler
+from ..core.type import MessageType, ListenerType, MessagePriority
+from ..message.entity import MessageContext, current_message_context
+from ..message.message_manager import MessageManager
+from ..message.stream import ReplyStream
+from ..models.usage import UsageRegistry
+from .codec import get_codec
+from .connection import Connection, ConnectionClosedError
+
+
+_END = object()
+
+
+class RemoteWorkerError(RuntimeError):
+    pass
+
+
+def encode_context(message_context: MessageContext):
+    return {
+        "mid": str(message_context.mid),
+        "build_time": message_context.build_time,
+        "type": message_context.type.value,
+        "sender": message_context.sender,
+        "deadline": message_context.deadline,
+        "parent_mid": str(message_context.parent_mid) if message_context.parent_mid is not None else None,
+        "trace_id": str(message_context.trace_id),
+    }
+
+def decode_context(data) -> MessageContext:
+    message_context = MessageContext()
+    message_context.mid = int(data["mid"])
+    message_context.build_time = data["build_time"]
+    message_context.type = MessageType(data["type"])
+    message_context.sender = data["sender"]
+    message_context.deadline = data["deadline"]
+    message_context.parent_mid = int(data["parent_mid"]) if data.get("parent_mid") is not None else None
+    message_context.trace_id = int(data["trace_id"]) if data.get("trace_id") is not None else message_context.mid
+    return message_context
+
+async def _replay_stream(items):
+    for item in items:
+        yield item
+
+def encode_error(e: BaseException):
+    return {"error": str(e), "error_type": type(e).__name__}
+
+def decode_error(frame):
+    # 仅还原调用方会区分处理的异常类型，其余统一为 RemoteWorkerError
+    match frame["error_type"]:
+        case "TimeoutError":
+            return TimeoutError(frame["error"])
+        case "LookupError":
+            return LookupError(frame["error"])
+        case _:
+            return RemoteWorkerError(f"{frame['error_type']}: {frame['error']}")
+
+
+# 一条连接上的请求/结果配对，rid 在连接内唯一。
+# 远端为异步生成器 listener 时，结果以若干 chunk 帧逐项送达，最后以带 stream 标记的 result 帧结束
+class RemotePeer:
+    def __init__(self, connection: Connection):
+        self.connection = connection
+        self._pending: dict[int, asyncio.Future] = dict()
+        self._streams: dict[int, asyncio.Queue] = dict()
+        self._next_rid = 0
+        self.closed = False
+
+    async def request(self, frame):
+        if self.closed:
+            raise RemoteWorkerError("Remote peer has disconnected")
+        rid = self._next_rid
+        self._next_rid += 1
+        future = asyncio.get_event_loop().create_future()
+        self._pending[rid] = future
+        try:
+            await self.connection.send({**frame, "rid": rid})
+            return await future
+        except asyncio.CancelledError:
+            if not self.closed:
+                asyncio.create_task(self.connection.send({"op": "cancel", "rid": rid}))
+            raise
+        finally:
+            self._pending.pop(rid, None)
+
+    def on_chunk(self, frame):
+        # 首个 chunk 到达时即结束 request()，后续 chunk 与结束帧写入该请求的队列
+        chunks = self._streams.get(frame["rid"])
+        if chunks is None:
+            future = self._pending.get(frame["rid"])
+            if future is None or future.done():
+                return
+            chunks = self._streams[frame["rid"]] = asyncio.Queue()
+            future.set_result({"rid": frame["rid"], "chunks": chunks})
+        chunks.put_nowait((frame["message"], None))
+
+    def on_result(self, frame):
+        chunks = self._streams.pop(frame["rid"], None)
+        if chunks is not None:
+            chunks.put_nowait((_END, decode_error(frame) if "error" in frame else None))
+            return
+        future = self._pending.get(frame["rid"])
+        if future is None or future.done():
+            return
+        if "error" in frame:
+            future.set_exception(decode_error(frame))
+        else:
+            future.set_result(frame)
+
+    async def stream(self, rid, chunks: asyncio.Queue):
+        # 跨连接不做流控，远端产出的 chunk 在本地队列中缓冲；提前关闭时通知远端取消生成器
+        finished = False
+        try:
+            while True:
+                message, error = await chunks.get()
+                if message is _END:
+                    finished = True
+                    if error is not None:
+                        raise error
+                    return
+                yield self.connection.unpack_message(message)
+        finally:
+            if not finished and self._streams.pop(rid, None) is not None and not self.closed:
+                asyncio.create_task(self.connection.send({"op": "cancel", "rid": rid}))
+
+    def close(self):
+        self.closed = True
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(RemoteWorkerError("Remote peer has disconnected"))
+        for chunks in self._streams.values():
+            chunks.put_nowait((_END, RemoteWorkerError("Remote peer has disconnected")))
+        self._streams.clear()
+
+
+# 代表另一进程/节点中 Worker 的代理，注册到 WorkerKeeper 后对 MessageManager 透明
+class RemoteWorker:
+    def __init__(self, name, peer: RemotePeer, channels):
+        self.name = name
+        self.peer = peer
+        self._channels = set(channels)
+
+    def get_notify_channel(self):
+        return self._channels
+
+    async def listen(self, listener_type, message, message_context, channel=None):
+        connection = self.peer.connection
+        result = await self.peer.request({
+            "op": "listen",
+            "worker": self.name,
+            "listener_type": listener_type.value,
+            "channel": channel,
+            "message": connection.pack_message(message),
+            "context": encode_context(message_context),
+        })
+        # 远端为异步生成器 listener 时，在本地以生成器逐项产出远端送达的 chunk
+        if "chunks" in result:
+            return self.peer.stream(result["rid"], result["chunks"])
+        if result.get("stream"):
+            return _replay_stream(())
+        return connection.unpack_message(result["message"])
+
+
+async def handle_listen(worker, frame, connection: Connection, tasks: dict, usage: UsageRegistry | None = None):
+    # 在本地 Worker 上执行远端发来的 listen 请求，并回送结果；usage 不为空时随结果回送期间新增的模型用量
+    message_context = decode_context(frame["context"])
+    current_message_context.set(message_context)
+    try:
+        if worker is None:
+            raise LookupError(f"Worker {frame.get('worker')} not found")
+        result = await worker.listen(ListenerType(frame["listener_type"]), connection.unpack_message(frame["message"]),
+                                     message_context, frame["channel"])
+        if inspect.isasyncgen(result):
+            # 生成器无法跨进程传递，逐项以 chunk 帧回送，最后以带 stream 标记的 result 帧结束
+            try:
+                async for item in result:
+                    await connection.send({"op": "chunk", "rid": frame["rid"], "message": connection.pack_message(item)})
+            finally:
+                await result.aclose()
+            reply = {"op": "result", "rid": frame["rid"], "stream": True}
+        else:
+            reply = {"op": "result", "rid": frame["rid"], "message": connection.pack_message(result)}
+    except asyncio.CancelledError:
+        return
+    except Exception as e:
+        logger.exception("Failed to handle remote message for {}", frame.get("worker"))
+        reply = {"op": "result", "rid": frame["rid"], **encode_error(e)}
+    finally:
+        tasks.pop(frame["rid"], None)
+    if usage is not None:
+        entries = usage.drain()
+        if entries:
+            reply["usage"] = entries
+    try:
+        await connection.send(reply)
+    except ConnectionError:
+        pass
+
+
+# 在子进程中运行 Worker，并通过本地 TCP 连接与父进程的 MessageManager 交换消息
+class ProcessWorkerHost:
+    def __init__(self, runtime, codec: str = "pickle", start_method: str = "spawn"):
+        self._runtime = runtime
+        self._codec = get_codec(codec)
+        self._mp_context = multiprocessing.get_context(start_method)
+        self._server = None
+        self._address = None
+        self._registering: dict[str, asyncio.Future] = dict()
+        self._processes = []
+        self._workers: list[RemoteWorker] = []
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._on_connect, "127.0.0.1", 0)
+        self._address = self._server.sockets[0].getsockname()[:2]
+
+    async def spawn(self, worker_factory, *args, **kwargs) -> RemoteWorker:
+        # worker_factory(runtime, *args, **kwargs) 在子进程中执行，需可被 pickle
+        if self._server is None:
+            await self.start()
+        key = secrets.token_hex(16)
+        future = asyncio.get_event_loop().create_future()
+        self._registering[key] = future
+        process = self._mp_context.Process(
+            target=run_worker_process,
+            args=(self._address, key, self._codec.name, worker_factory, args, kwargs),
+            daemon=True)
+        process.start()
+        self._processes.append(process)
+        # 子进程在注册前退出（导入失败、被杀死等）时不会再连接，需同时监视其存活状态
+        watcher = asyncio.create_task(self._watch_start(process, future))
+        try:
+            return await future
+        finally:
+            watcher.cancel()
+            self._registering.pop(key, None)
+
+    @staticmethod
+    async def _watch_start(process, future: asyncio.Future, interval: float = 0.1):
+        while not future.done():
+            if not process.is_alive():
+                # 给已发出的注册或错误帧留出送达时间
+                await asyncio.sleep(interval)
+                if not future.done():
+                    future.set_exception(RemoteWorkerError(
+                        f"Worker process exited with code {process.exitcode} before registering"))
+                return
+            await asyncio.sleep(interval)
+
+    async def stop(self, timeout: float = 5):
+        for worker in self._workers:
+            if not worker.peer.closed:
+                try:
+                    await worker.peer.connection.send({"op": "stop"})
+                except ConnectionError:
+                    pass
+        loop = asyncio.get_event_loop()
+        for process in self._processes:
+            await loop.run_in_executor(None, process.join, timeout)
+            if process.is_alive():
+                process.terminate()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _on_connect(self, reader, writer):
+        connection = Connection(reader, writer, self._codec)
+        try:
+            frame = await connection.recv()
+        except ConnectionClosedError:
+            # 子进程在注册前退出，由 _watch_start 结束等待
+            return
+        if frame.get("op") != "register" or frame.get("key") not in self._registering:
+            logger.error("Rejected unknown worker process connection")
+            await connection.close()
+            return
+        if "error" in frame:
+            # worker_factory 在子进程中抛出异常
+            if not self._registering[frame["key"]].done():
+                self._registering[frame["key"]].set_exception(decode_error(frame))
+            await connection.close()
+            return
+        worker = RemoteWorker(frame["worker"], RemotePeer(connection), frame["channels"])
+        self._workers.append(worker)
+        self._registering[frame["key"]].set_result(worker)
+        await self._serve(connection, worker)
+
+    async def _serve(self, connection: Connection, worker: RemoteWorker):
+        remote_calls: dict[int, asyncio.Task] = dict()
+        try:
+            while True:
+                frame = await connection.recv()
+                match frame["op"]:
+                    case "chunk":
+                        worker.peer.on_chunk(frame)
+                    case "result":
+                        if "usage" in frame:
+                            self._runtime.usage.absorb(frame["usage"])
+                        worker.peer.on_result(frame)
+                    case "usage":
+                        self._runtime.usage.absorb(frame["usage"])
+                    case "put":
+                        asyncio.create_task(self._put(connection, frame, remote_calls))
+                    case "cancel":
+                        if frame["rid"] in remote_calls:
+                            remote_calls[frame["rid"]].cancel()
+        except ConnectionClosedError:
+            logger.warning("Worker process of {} disconnected", worker.name)
+        finally:
+            worker.peer.close()
+            for task in remote_calls.values():
+                task.cancel()
+
+    async def _put(self, connection: Connection, frame, remote_calls):
+        message_type = MessageType(frame["type"])
+        deadline = frame["deadline"]
+        timeout = deadline - datetime.now().timestamp() if deadline is not None else None
+        try:
+            priority = MessagePriority(frame["priority"]) if frame.get("priority") is not None else None
+            future = await self._runtime.message_manager.put_message(
+                frame["message"], frame["recipient"], frame["sender"], message_type, timeout, priority)
+        except Exception as e:
+            if message_type is MessageType.REQUEST:
+                await connection.send({"op": "reply", "rid": frame["rid"], **encode_error(e)})
+            else:
+                logger.error("Failed to publish message from worker process: {}", e)
+            return
+        if future is None:
+            return
+
+        remote_calls[frame["rid"]] = asyncio.current_task()
+        try:
+            message = await future
+            reply = {"op": "reply", "rid": frame["rid"], "message": message}
+            if isinstance(message, ReplyStream):
+                # 与 handle_listen 相同，流式应答逐项以 chunk 帧回送
+                async with message:
+                    async for item in message:
+                        await connection.send({"op": "chunk", "rid": frame["rid"], "message": item})
+                reply = {"op": "reply", "rid": frame["rid"], "stream": True}
+        except asyncio.CancelledError:
+            return
+        except Exception as e:
+            reply = {"op": "reply", "rid": frame["rid"], **encode_error(e)}
+        finally:
+            remote_calls.pop(frame["rid"], None)
+        await connection.send(reply)
+
+
+# 子进程内的消息出口，所有 call/publish 都转发给父进程
+class ProcessMessageManager:
+    def __init__(self, connection: Connection):
+        self._connection = connection
+        self._pending: dict[int, asyncio.Future] = dict()
+        self._streams: dict[int, ReplyStream] = dict()
+        self._next_rid = 0
+
+    async def put_message(self, message, recipient, sender, message_type: MessageType, timeout: float | None = None,
+                          priority: MessagePriority | None = None, stream_buffer: int = 16):
+        # 流式应答由父进程逐项回送，子进程侧缓冲不设上限，stream_buffer 不起作用
+        rid = self._next_rid
+        self._next_rid += 1
+        reply_callback = None
+        if message_type is MessageType.REQUEST:
+            reply_callback = asyncio.get_event_loop().create_future()
+            self._pending[rid] = reply_callback
+            reply_callback.add_done_callback(lambda future: self._on_done(rid, future))
+        await self._connection.send({
+            "op": "put",
+            "rid": rid,
+            "type": message_type.value,
+            "message": message,
+            "recipient": recipient,
+            "sender": sender,
+            "deadline": MessageManager._get_deadline(timeout) if message_type is MessageType.REQUEST else None,
+            "priority": priority.value if priority is not None else None,
+        })
+        return reply_callback
+
+    def _on_done(self, rid, future):
+        self._pending.pop(rid, None)
+        if future.cancelled():
+            asyncio.create_task(self._connection.send({"op": "cancel", "rid": rid}))
+
+    def on_chunk(self, frame):
+        stream = self._streams.get(frame["rid"])
+        if stream is None:
+            future = self._pending.get(frame["rid"])
+            if future is None or future.done():
+                return
+            stream = self._streams[frame["rid"]] = ReplyStream(0)
+            future.set_result(stream)
+        if stream.buffer.closed:
+            # 调用方已关闭流，通知父进程停止回送
+            self._streams.pop(frame["rid"])
+            asyncio.create_task(self._connection.send({"op": "cancel", "rid": frame["rid"]}))
+            return
+        stream.feed(frame["message"])
+
+    def on_reply(self, frame):
+        stream = self._streams.pop(frame["rid"], None)
+        if stream is not None:
+            stream.finish(decode_error(frame) if "error" in frame else None)
+            return
+        future = self._pending.get(frame["rid"])
+        if future is None or future.done():
+            return
+        if "error" in frame:
+            future.set_exception(decode_error(frame))
+        elif frame.get("stream"):
+            future.set_result(ReplyStream.of())
+        else:
+            future.set_result(frame["message"])
+
+
+class ProcessRuntime:
+    def __init__(self, message_manager: ProcessMessageManager):
+        self.message_manager = message_manager
+        self.executor = ListenerExecutor()
+        self.profiler = ListenerProfiler()
+        self.usage = UsageRegistry()  # 子进程内的模型用量，随 result 帧回送后在父进程的 runtime.usage 中合并
+
+
+def run_worker_process(address, key, codec_name, worker_factory, args, kwargs):
+    asyncio.run(_serve_worker(address, key, codec_name, worker_factory, args, kwargs))
+
+async def _serve_worker(address, key, codec_name, worker_factory, args, kwargs):
+    connection = Connection(*await asyncio.open_connection(*address), get_codec(codec_name))
+    message_manager = ProcessMessageManager(connection)
+    runtime = ProcessRuntime(message_manager)
+    try:
+        worker = worker_factory(runtime, *args, **kwargs)
+    except Exception as e:
+        await connection.send({"op": "register", "key": key, **encode_error(e)})
+        await connection.close()
+        raise
+    await connection.send({
+        "op": "register",
+        "key": key,
+        "worker": worker.name,
+        "channels": list(worker.get_notify_channel()),
+    })
+
+    tasks: dict[int, asyncio.Task] = dict()
+    try:
+        while True:
+            frame = await connection.recv()
+            match frame["op"]:
+                case "listen":
+                    tasks[frame["rid"]] = asyncio.create_task(
+                        handle_listen(worker, frame, connection, tasks, runtime.usage))
+                case "cancel":
+                    if frame["rid"] in tasks:
+                        tasks[frame["rid"]].cancel()
+                case "chunk":
+                    message_manager.on_chunk(frame)
+                case "reply":
+                    message_manager.on_reply(frame)
+                case "stop":
+                    break
+    except ConnectionClosedError:
+        pass
+    finally:
+        for task in list(tasks.values()):
+            task.cancel()
+        runtime.executor.shutdown()
+        # 回送最后一次结果之后产生的用量（如后台任务中的模型调用）
+        entries = runtime.usage.drain()
+        if entries:
+            try:
+                await connection.send({"op": "usage", "usage": entries})
+            except ConnectionError:
+                pass
+        await connection.close()
@@ -11,6 +11,11 @@ class Image:
     def from_base64(cls, base64_str: str):
         return cls(PILImage.open(BytesIO(base64.b64decode(base64_str))))
 
+    @classmethod
+    def from_file(cls, path):
+        # 图片解码较慢，在事件循环中应通过 run_blocking 在线程池中执行
+        return cls(PILImage.open(path))
+
     def to_base64(self):
         buffered = BytesIO()
         self.image.save(buffered, format="PNG")
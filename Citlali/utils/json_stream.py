@@ -0,0 +1,42 @@
+import json
+
+
+# 增量 JSON 解析：逐段喂入模型输出，每当顶层对象或（任意层级）数组中的对象闭合时立即解析并返回，
+# 无需等待完整应答。JSON 之外的文本（如 ```json 代码块标记）会被忽略
+class IncrementalJSONParser:
+    def __init__(self):
+        self._text = ""
+        self._position = 0
+        self._stack = []  # (开始位置, 括号, 是否为数组元素)
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, delta: str):
+        self._text += delta
+        completed = []
+        text = self._text
+        for i in range(self._position, len(text)):
+            char = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+            match char:
+                case '"' if self._stack:
+                    self._in_string = True
+                case "{" | "[":
+                    in_array = bool(self._stack) and self._stack[-1][1] == "["
+                    self._stack.append((i, char, in_array))
+                case "}" | "]" if self._stack:
+                    start, bracket, in_array = self._stack.pop()
+                    if bracket == "{" and (in_array or not self._stack):
+                        try:
+                            completed.append(json.loads(text[start:i + 1]))
+                        except ValueError:
+                            pass
+        self._position = len(text)
+        return completed
@@ -12,7 +12,7 @@ from Citlali.models.entity import ChatMessage
 from Citlali.utils.image import Image
 from PIL import Image as PILImage
 
-from Fairy.message_entity import EventMessage, CallMessage
+from Fairy.message_entity import EventMessage, event_channel, CallMessage
 from Fairy.type import EventType, EventStatus, CallType, MemoryType
 
 
@@ -35,17 +35,16 @@ class ApiDependencyAgent(Agent):
         with open(self.file_path, 'r', encoding='utf-8') as f:
             return json.load(f)
 
-    @listener(ListenerType.ON_NOTIFIED, channel="app_channel",
-              listen_filter=lambda msg: msg.event == EventType.Plan and msg.status == EventStatus.CREATED)
+    @listener(ListenerType.ON_NOTIFIED, channel=event_channel(EventType.Plan, EventStatus.CREATED))
     async def on_plan_init(self, message: EventMessage, message_context):
         logger.info("[ApiDependency] TASK in progress...")
 
         # 读取 JSON 数据（从文件或硬编码）
         json_data = self.load_json_data()
         prompt = self.build_init_prompt(json_data)
-        api_dependency_res = await self.request_llm(prompt)
+        api_dependency_res = await self.request_llm(prompt, prompt_kind="api_dependency")
         print(api_dependency_res)
-        self.neo4j_parser.update_api_dependency(api_dependency_res)
+        await self.run_blocking(self.neo4j_parser.update_api_dependency, api_dependency_res)
         logger.info("成功更新全部 API 间依赖信息到 Neo4j")
 
         # # 记录当前分析结果
@@ -55,7 +54,7 @@ class ApiDependencyAgent(Agent):
         # })
 
         # # 发布Plan事件
-        # await self.publish("app_channel", EventMessage(EventType.Plan, EventStatus.DONE, plan_event_content))
+        # await self.publish(event_channel(EventType.Plan, EventStatus.DONE), EventMessage(EventType.Plan, EventStatus.DONE, plan_event_content))
         # logger.info("[Plan(First Run)] TASK completed.")
 
         # print(all_analysis_results)
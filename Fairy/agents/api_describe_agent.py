@@ -1,22 +1,25 @@
+import asyncio
 import json
 import re
 
 from loguru import logger
 
 from Citlali.core.agent import Agent
-from Citlali.core.type import ListenerType
+from Citlali.core.type import ListenerType, MessagePriority
 from Citlali.core.worker import listener
 from Citlali.models.entity import ChatMessage
 
 from Citlali.utils.image import Image
-from PIL import Image as PILImage
 
-from Fairy.message_entity import EventMessage, CallMessage
+from Fairy.message_entity import EventMessage, event_channel, CallMessage
 from Fairy.type import EventType, EventStatus, CallType, MemoryType
 
 
 class ApiDescribeAgent(Agent):
-    def __init__(self, runtime, model_client, neo4j_parser, file_path) -> None:
+    # 批量分析类 Agent，模型调用让位于交互类请求
+    llm_priority = MessagePriority.LOW
+
+    def __init__(self, runtime, model_client, neo4j_parser, file_path, concurrency: int = 4) -> None:
         system_messages = [ChatMessage(
             content="You are an experienced full-stack developer with over eight years of front-end and back-end development experience. You are proficient in various front-end page design and implementation techniques as well as back-end development. You also possess strong data analysis skills, enabling you to infer API description , parameter description and response description from provided api information (including JSON data and screenshots).",
             type="SystemMessage")]
@@ -26,13 +29,14 @@ class ApiDescribeAgent(Agent):
         # 初始化 Neo4j Parser（单例）
         self.neo4j_parser = neo4j_parser
         self.file_path = file_path
+        # 同时分析的 API 数上限，每个 API 的截图在分析期间常驻内存；批量模式下应不小于 batch 大小
+        self._semaphore = asyncio.Semaphore(concurrency)
 
     def load_json_data(self):
         with open(self.file_path, 'r', encoding='utf-8') as f:
             return json.load(f)
 
-    @listener(ListenerType.ON_NOTIFIED, channel="app_channel",
-              listen_filter=lambda msg: msg.event == EventType.Plan and msg.status == EventStatus.CREATED)
+    @listener(ListenerType.ON_NOTIFIED, channel=event_channel(EventType.Plan, EventStatus.CREATED))
     async def on_plan_init(self, message: EventMessage, message_context):
         logger.info("[Describe] TASK in progress...")
 
@@ -42,8 +46,8 @@ class ApiDescribeAgent(Agent):
         # 读取 JSON 数据（从文件或硬编码）
         json_data = self.load_json_data()  # 假设这个方法加载 output.json 数据
 
-        # 存储所有分析结果
-        all_analysis_results = []
+        # 每个 API 的分析互不依赖，按 concurrency 并发发起；模型客户端为批量模式时这些请求会合并为 batch 提交
+        jobs = []
         # 遍历所有数据项，并记录前一个 item 的 filename 作为上一张截图
         all_images = [f"{item['filename']}" for item in json_data]
 
@@ -55,41 +59,55 @@ class ApiDescribeAgent(Agent):
             current_image_path = all_images[idx]  # 当前项截图路径
             previous_image_path = all_images[idx - 1] if idx > 0 else None  # 上一项截图路径（不管是否有 api_list）
 
-            # 构建 prompt，并准备图像输入
-            has_previous_screenshot = previous_image_path is not None
-
             # 每个 API 单独处理
             for api in item["api_list"]:
-                # 构造仅包含当前 API 的临时数据结构
-                single_api_data = {
-                    **{k: v for k, v in item.items() if k != "api_list"},
-                    "api_list": [api]  # 只包含当前 API
-                }
-                prompt = self.build_init_prompt(single_api_data, has_previous_screenshot)
+                jobs.append(self.describe_api(item, api, current_image_path, previous_image_path))
 
-                # 准备图像列表：先加入上一张截图（如果有）
-                images = []
-                if has_previous_screenshot:
-                    images.append(Image(PILImage.open(previous_image_path)))  # 上一张截图
+        # 存储所有分析结果，单个 API 失败不影响其余 API
+        all_analysis_results = []
+        for result in await asyncio.gather(*jobs, return_exceptions=True):
+            if isinstance(result, Exception):
+                logger.opt(exception=result).error("[Describe] Failed to describe an API")
+            else:
+                all_analysis_results.append(result)
 
-                images.append(Image(PILImage.open(current_image_path)))  # 当前截图
+        # # 发布Plan事件
+        # await self.publish(event_channel(EventType.Plan, EventStatus.DONE), EventMessage(EventType.Plan, EventStatus.DONE, plan_event_content))
+        # logger.info("[Plan(First Run)] TASK completed.")
 
-                # 请求 LLM
-                api_description_res = await self.request_llm(prompt, images)
 
-                self.neo4j_parser.update_single_api_description(api_description_res)
-                logger.info("成功更新单个 API 描述信息到 Neo4j")
+    async def describe_api(self, item, api, current_image_path, previous_image_path):
+        async with self._semaphore:
+            return await self._describe_api(item, api, current_image_path, previous_image_path)
 
-                # 记录当前分析结果
-                all_analysis_results.append({
-                    "item": item,
-                    "api_description_res": api_description_res,
-                })
+    async def _describe_api(self, item, api, current_image_path, previous_image_path):
+        # 构造仅包含当前 API 的临时数据结构
+        single_api_data = {
+            **{k: v for k, v in item.items() if k != "api_list"},
+            "api_list": [api]  # 只包含当前 API
+        }
+        # 构建 prompt，并准备图像输入
+        has_previous_screenshot = previous_image_path is not None
+        prompt = self.build_init_prompt(single_api_data, has_previous_screenshot)
 
-        # # 发布Plan事件
-        # await self.publish("app_channel", EventMessage(EventType.Plan, EventStatus.DONE, plan_event_content))
-        # logger.info("[Plan(First Run)] TASK completed.")
+        # 准备图像列表：先加入上一张截图（如果有）
+        images = []
+        if has_previous_screenshot:
+            images.append(await self.run_blocking(Image.from_file, previous_image_path))  # 上一张截图
+
+        images.append(await self.run_blocking(Image.from_file, current_image_path))  # 当前截图
+
+        # 请求 LLM
+        api_description_res = await self.request_llm(prompt, images, prompt_kind="api_description")
 
+        await self.run_blocking(self.neo4j_parser.update_single_api_description, api_description_res)
+        logger.info("成功更新单个 API 描述信息到 Neo4j")
+
+        # 记录当前分析结果
+        return {
+            "item": item,
+            "api_description_res": api_description_res,
+        }
 
     @staticmethod
     def build_init_prompt(json_data, has_previous_screenshot) -> str:
@@ -5,17 +5,19 @@ from urllib.parse import urlparse
 from loguru import logger
 
 from Citlali.core.agent import Agent
-from Citlali.core.type import ListenerType
+from Citlali.core.type import ListenerType, MessagePriority
 from Citlali.core.worker import listener
 from Citlali.models.entity import ChatMessage
 
 from Citlali.utils.image import Image
-from PIL import Image as PILImage
 
-from Fairy.message_entity import EventMessage, CallMessage
+from Fairy.message_entity import EventMessage, event_channel, CallMessage
 from Fairy.type import EventType, EventStatus, CallType, MemoryType
 
 class ParamAnalyzeAgent(Agent):
+    # 批量分析类 Agent，模型调用让位于交互类请求
+    llm_priority = MessagePriority.LOW
+
     def __init__(self, runtime, model_client, neo4j_parser, file_path) -> None:
         system_messages = [ChatMessage(
             content="You are an experienced full-stack developer with over eight years of front-end and back-end development experience. You are proficient in various front-end page design and implementation techniques as well as back-end development. You also possess strong data analysis skills, enabling you to analyze only request parameter source , parameter conversion detection and parameter constraint from provided api information (including JSON data and screenshots).",
@@ -31,8 +33,7 @@ class ParamAnalyzeAgent(Agent):
         with open(self.file_path, 'r', encoding='utf-8') as f:
             return json.load(f)
 
-    @listener(ListenerType.ON_NOTIFIED, channel="app_channel",
-              listen_filter=lambda msg: msg.event == EventType.Plan and msg.status == EventStatus.CREATED)
+    @listener(ListenerType.ON_NOTIFIED, channel=event_channel(EventType.Plan, EventStatus.CREATED))
     async def on_plan_init(self, message: EventMessage, message_context):
         logger.info("[Param Analyze] TASK in progress...")
 
@@ -59,7 +60,7 @@ class ParamAnalyzeAgent(Agent):
                 }
                 processed_data.append(single_api_data)
 
-        descriptions = self.neo4j_parser.get_api_param_description(processed_data)
+        descriptions = await self.run_blocking(self.neo4j_parser.get_api_param_description, processed_data)
 
         for i in range(len(processed_data)):
             current_api = processed_data[i]
@@ -71,16 +72,16 @@ class ParamAnalyzeAgent(Agent):
             has_previous_screenshot = previous_image_path is not None
             images = []
             if has_previous_screenshot:
-                images.append(Image(PILImage.open(previous_image_path)))  # 上一张截图
+                images.append(await self.run_blocking(Image.from_file, previous_image_path))  # 上一张截图
 
             # 准备图像列表：先加入上一张截图（如果有）
-            images.append(Image(PILImage.open(current_image_path)))  # 当前截图
+            images.append(await self.run_blocking(Image.from_file, current_image_path))  # 当前截图
 
             # 获取当前元素之前的所有api描述
             previous_descriptions = descriptions[:i]
 
             # 如果是已经存在的节点，则附上已分析的数据
-            analyzed_param = self.neo4j_parser.get_analyzed_api_param(current_api)
+            analyzed_param = await self.run_blocking(self.neo4j_parser.get_analyzed_api_param, current_api)
             has_analyzed_params = analyzed_param and (
                     analyzed_param[0]["source"] is not None or
                     analyzed_param[0]["conversion"] is not None
@@ -93,13 +94,13 @@ class ParamAnalyzeAgent(Agent):
                 analyzed_param if has_analyzed_params else None
             )
 
-            parameter_analysis = await self.request_llm(prompt, images)
+            parameter_analysis = await self.request_llm_stream(prompt, images, prompt_kind="param_analysis")
             print(parameter_analysis)
             current_url = current_api["api"]["url"]
             current_path = urlparse(current_url).path
             current_method = current_api["api"]["method"]
 
-            self.neo4j_parser.update_param_analysis(parameter_analysis, current_path, current_method)
+            await self.run_blocking(self.neo4j_parser.update_param_analysis, parameter_analysis, current_path, current_method)
             logger.info("成功更新API参数信息到 Neo4j")
 
             # 记录当前分析结果
@@ -232,6 +233,11 @@ class ParamAnalyzeAgent(Agent):
             prompt += f"Historical parameter analysis results: \n{param_text}\n"
         return prompt
 
+    async def on_llm_object(self, obj):
+        # 参数分析应答较长，每个参数解析完成即输出进度
+        if "name" in obj and "source" in obj:
+            logger.info("[ParamAnalyze] parameter {} analyzed", obj["name"])
+
     def parse_response(self, response: str):
         print(response)
 
@@ -1,6 +1,22 @@
+import os
+
 APIDataParser_path = r"E:\agent\api\output.json"
 
 neo4j_url = "bolt://localhost:7687"
 neo4j_user = "neo4j"
 neo4j_password = "12345678"
 nro4j_database = "umami"
+
+# LLM 应答缓存目录，重复分析同一份 output.json 时直接复用结果
+llm_cache_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "llm_cache")
+
+# 模型服务的请求数/Token 数配额（每分钟），由 AdmissionController 统一限流
+llm_requests_per_minute = 500
+llm_tokens_per_minute = 30000
+
+# 离线批量模式：FairyCore.describe_apis 的 API 描述请求通过 Batch API 提交，每个 batch 至多 llm_batch_size 条
+llm_batch_mode = False
+llm_batch_size = 100
+
+# 模型用量统计（按 Agent 与提示词类别汇总 Token、延迟、图片数），运行期间周期性写出
+llm_usage_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "llm_usage.json")
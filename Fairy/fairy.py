@@ -1,10 +1,16 @@
+import asyncio
 import os
 import subprocess
 
 from loguru import logger
 
 from Citlali.core.runtime import CitlaliRuntime
+from Citlali.core.type import DeliveryPolicy
+from Citlali.models.cache import ResponseCache
+from Citlali.models.openai.batch import BatchChatClient
 from Citlali.models.openai.client import OpenAIChatClient
+from Citlali.models.rate_limiter import AdmissionController
+from Citlali.models.usage import UsageRegistry
 
 from Fairy.agents.api_describe_agent import ApiDescribeAgent
 from Fairy.agents.param_analyze_agent import ParamAnalyzeAgent
@@ -20,7 +26,7 @@ from Fairy.fairy_config import Config
 from Fairy.config.config import *
 from Fairy.memory.api_memory import ApiMemory
 from Fairy.memory.neo4j_api_data_parser import APIDataParser
-from Fairy.message_entity import EventMessage
+from Fairy.message_entity import EventMessage, event_channel
 from Fairy.type import EventType, EventStatus
 
 os.environ["OPENAI_API_KEY"] = "sk-zk2d9aae813fa366fafd3e4d9548327d66e68536902222b2"
@@ -33,23 +39,67 @@ class FairyCore:
         self._model_client = OpenAIChatClient({
             'model': "gpt-4o-2024-11-20",
             'temperature': 0
-        })
+        }, cache=ResponseCache(directory=llm_cache_path),
+            limiter=AdmissionController(llm_requests_per_minute, llm_tokens_per_minute))
+        # 离线的 API 描述分析可走 Batch API，以更低成本换取更长的完成时间
+        self._describe_model_client = BatchChatClient(self._model_client, batch_size=llm_batch_size) \
+            if llm_batch_mode else self._model_client
         self._config = Config(adb_path=os.environ["ADB_PATH"])
-
+        # 模型客户端、用量统计与 Neo4j 驱动在所有会话间共享，Runtime 与记忆按会话独立
+        self._neo4j_parser = None
+        self._usage = UsageRegistry()
+
+    def get_neo4j_parser(self):
+        if self._neo4j_parser is None:
+            self._neo4j_parser = APIDataParser(APIDataParser_path, neo4j_url, neo4j_user, neo4j_password, nro4j_database)
+        return self._neo4j_parser
+
+    async def start_many(self, instructions):
+        # 同一进程内并发执行多条指令，每条指令运行在独立的 Runtime 中
+        return await asyncio.gather(*(self.start(instruction) for instruction in instructions),
+                                    return_exceptions=True)
+
+    async def describe_apis(self):
+        # 离线分析 APIDataParser_path 中全部 API 的描述并写入 Neo4j，llm_batch_mode 开启时合并为 batch 提交
+        runtime = self.new_runtime()
+        concurrency = llm_batch_size if llm_batch_mode else 4
+        runtime.register(lambda: ApiDescribeAgent(runtime, self._describe_model_client, self.get_neo4j_parser(),
+                                                  APIDataParser_path, concurrency))
+        await runtime.publish(event_channel(EventType.Plan, EventStatus.CREATED),
+                              EventMessage(EventType.Plan, EventStatus.CREATED, None))
+        await runtime.stop()
+        if isinstance(self._describe_model_client, BatchChatClient):
+            await self._describe_model_client.close()
+
+    def new_runtime(self):
+        runtime = CitlaliRuntime(usage=self._usage)
+        runtime.run()
+        # 用量统计由所有会话共同写入同一文件，首个会话启动时开始周期性写出
+        if not self._usage.dumping:
+            self._usage.start_dump(llm_usage_path)
+        return runtime
+
+    def close(self):
+        self._usage.stop_dump()
+        self._usage.dump(llm_usage_path)
+        if self._neo4j_parser is not None:
+            self._neo4j_parser.driver.close()
+            self._neo4j_parser = None
 
     async def start(self, instruction):
         # await self.get_device()
 
-        runtime = CitlaliRuntime()
-        runtime.run()
+        runtime = self.new_runtime()
+        # 截屏感知事件产生速度远高于消费速度，只保留尚未处理的最新一帧
+        runtime.set_channel_policy(event_channel(EventType.ScreenPerception, EventStatus.DONE), DeliveryPolicy.LATEST)
         api_memory = ApiMemory()
 
 
-        neo4j_parser = APIDataParser(APIDataParser_path, neo4j_url, neo4j_user, neo4j_password, nro4j_database)
-        # runtime.register(lambda: ApiDescribeAgent(runtime, self._model_client, neo4j_parser, APIDataParser_path))
+        neo4j_parser = self.get_neo4j_parser()
+        # runtime.register(lambda: ApiDescribeAgent(runtime, self._describe_model_client, neo4j_parser, APIDataParser_path))
         # runtime.register(lambda: ParamAnalyzeAgent(runtime, self._model_client, neo4j_parser, APIDataParser_path))
         runtime.register(lambda: ApiDependencyAgent(runtime, self._model_client, neo4j_parser, APIDataParser_path))
-        await runtime.publish("app_channel", EventMessage(EventType.Plan, EventStatus.CREATED, instruction))
+        await runtime.publish(event_channel(EventType.Plan, EventStatus.CREATED), EventMessage(EventType.Plan, EventStatus.CREATED, instruction))
 
         # runtime.register(lambda: ApiFilterAgent(runtime, self._model_client, api_memory, neo4j_parser))
         # runtime.register(lambda: ApiPlannerAgent(runtime, self._model_client, api_memory, neo4j_parser))
@@ -60,7 +110,7 @@ class FairyCore:
         # runtime.register(lambda: KeyInfoExtractorAgent(runtime, self._model_client))
         # runtime.register(lambda: ShortTimeMemoryManager(runtime))
 
-        # await runtime.publish("app_channel", EventMessage(EventType.Filter, EventStatus.CREATED, instruction))
+        # await runtime.publish(event_channel(EventType.Filter, EventStatus.CREATED), EventMessage(EventType.Filter, EventStatus.CREATED, instruction))
 
 
         # api_memory.set_instruction("把我的账号状态设置为在线状态")
@@ -68,10 +118,10 @@ class FairyCore:
         #                 {'step2': {'method': 'POST', 'url': '/system/role/checkRoleKeyUnique'}}]
         # api_memory.set_total_plans(api_plan_res)
         # execute
-        # await runtime.publish("app_channel", EventMessage(EventType.Plan, EventStatus.DONE, instruction))
+        # await runtime.publish(event_channel(EventType.Plan, EventStatus.DONE), EventMessage(EventType.Plan, EventStatus.DONE, instruction))
 
         # reflect
-        # await runtime.publish("app_channel", EventMessage(EventType.ActionExecution, EventStatus.CREATED, instruction))
+        # await runtime.publish(event_channel(EventType.ActionExecution, EventStatus.CREATED), EventMessage(EventType.ActionExecution, EventStatus.CREATED, instruction))
 
 
         await runtime.stop()
\ No newline at end of file
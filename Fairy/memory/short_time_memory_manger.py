@@ -4,7 +4,7 @@ from loguru import logger
 
 from Citlali.core.type import ListenerType
 from Citlali.core.worker import Worker, listener
-from Fairy.message_entity import EventMessage, CallMessage
+from Fairy.message_entity import EventMessage, event_channel, CallMessage
 from Fairy.type import EventType, EventStatus, CallType, MemoryType
 
 
@@ -41,45 +41,39 @@ class ShortTimeMemoryManager(Worker):
             # 通知等待记忆提供的任务
             self.memory_ready_event[memory_type].set()
 
-    @listener(ListenerType.ON_CALLED, listen_filter=lambda message: message.call == CallType.Memory_GET)
+    @listener(ListenerType.ON_CALLED, match={"call": CallType.Memory_GET})
     async def get_memory(self, message: CallMessage, message_context):
         memory = {}
         for memory_type in message.call_content:
             memory[memory_type] = await self._get_memory(memory_type)
         return memory
 
-    @listener(ListenerType.ON_NOTIFIED, channel="app_channel",
-              listen_filter=lambda message: message.event == EventType.Plan and message.status == EventStatus.CREATED)
+    @listener(ListenerType.ON_NOTIFIED, channel=event_channel(EventType.Plan, EventStatus.CREATED))
     async def set_instruction(self, message: EventMessage, message_context):
         self.current_memory[MemoryType.Instruction] = message.event_content
         await self.set_memory_ready(MemoryType.Plan)
 
-    @listener(ListenerType.ON_NOTIFIED, channel="app_channel",
-              listen_filter=lambda message: message.event == EventType.ScreenPerception and message.status == EventStatus.DONE)
+    @listener(ListenerType.ON_NOTIFIED, channel=event_channel(EventType.ScreenPerception, EventStatus.DONE))
     async def set_screen_perception_memory(self, message: EventMessage, message_context):
         self.current_memory[MemoryType.ScreenPerception].append(message.event_content)
         await self.set_memory_ready(MemoryType.ScreenPerception)
 
-    @listener(ListenerType.ON_NOTIFIED, channel="app_channel",
-              listen_filter=lambda message: message.event == EventType.Plan and message.status == EventStatus.DONE)
+    @listener(ListenerType.ON_NOTIFIED, channel=event_channel(EventType.Plan, EventStatus.DONE))
     async def set_plan_memory(self, message: EventMessage, message_context):
         self.current_memory[MemoryType.Plan].append(message.event_content)
         await self.set_memory_ready(MemoryType.Plan)
 
-    @listener(ListenerType.ON_NOTIFIED, channel="app_channel",
-              listen_filter=lambda message: message.event == EventType.Reflection and message.status == EventStatus.DONE)
+    @listener(ListenerType.ON_NOTIFIED, channel=event_channel(EventType.Reflection, EventStatus.DONE))
     async def set_action_result_memory(self, message: EventMessage, message_context):
         self.current_memory[MemoryType.ActionResult].append(message.event_content)
         await self.set_memory_ready(MemoryType.ActionResult)
 
-    @listener(ListenerType.ON_NOTIFIED, channel="app_channel",
-              listen_filter=lambda message: message.event == EventType.ActionExecution and message.status == EventStatus.DONE)
+    @listener(ListenerType.ON_NOTIFIED, channel=event_channel(EventType.ActionExecution, EventStatus.DONE))
     async def set_action_memory(self, message: EventMessage, message_context):
         self.current_memory[MemoryType.Action].append(message.event_content)
         await self.set_memory_ready(MemoryType.Action)
 
-    @listener(ListenerType.ON_NOTIFIED, channel="app_channel",
-              listen_filter=lambda message: message.event == EventType.KeyInfoExtraction and message.status == EventStatus.DONE)
+    @listener(ListenerType.ON_NOTIFIED, channel=event_channel(EventType.KeyInfoExtraction, EventStatus.DONE))
     async def set_key_info_memory(self, message: EventMessage, message_context):
         self.current_memory[MemoryType.KeyInfo].append(message.event_content)
         await self.set_memory_ready(MemoryType.KeyInfo)
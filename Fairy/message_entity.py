@@ -3,6 +3,10 @@ from datetime import datetime
 from Fairy.type import EventType, EventStatus, CallType
 
 
+def event_channel(event: EventType, status: EventStatus):
+    # 分层频道名，如 app.plan.created；订阅方可用 app.*.done、app.# 等通配模式
+    return f"app.{event.name.lower()}.{status.name.lower()}"
+
 class EventMessage:
     def __init__(self, event: EventType, status: EventStatus, event_content=None):
         self.event = event
@@ -1,12 +1,15 @@
 import asyncio
+import random
 
 from loguru import logger
 
 
 class TaskExecutor:
-    def __init__(self, task_name, task_desc, retry_times: int = 3):
+    def __init__(self, task_name, task_desc, retry_times: int = 3, backoff: float = 2, max_backoff: float = 30):
         self.task_name = f"TASK [{task_name}]{f'({task_desc})' if task_desc is not None else ''}"
         self.retry_times = retry_times
+        self.backoff = backoff
+        self.max_backoff = max_backoff
 
     async def run(self, func):
         for i in range(self.retry_times+1):
@@ -22,7 +25,8 @@ class TaskExecutor:
 
             elif i < self.retry_times:
                 logger.error(f"{self.task_name} retrying [{i}/{self.retry_times}] ...")
-                await asyncio.sleep(2)
+                # 指数退避并加随机抖动，避免多个任务同时重试
+                await asyncio.sleep(min(self.backoff * 2 ** i, self.max_backoff) * random.uniform(0.5, 1.5))
                 continue
 
             elif i == self.retry_times:
@@ -13,7 +13,10 @@ ADB_PATH = "C:/Users/neosunjz/AppData/Local/Android/Sdk/platform-tools/adb.exe -
 async def main():
     fairy = FairyCore()
     instruction = "Delete all pictures in an album and empty the recycle bin."
-    await fairy.start(instruction)
+    try:
+        await fairy.start(instruction)
+    finally:
+        fairy.close()
 
 if __name__ == '__main__':
     asyncio.run(main())
@@ -0,0 +1,31 @@
+from Citlali.core.type import MessageType
+from Citlali.message.entity import MessageParcel
+from Citlali.message.message_log import MessageLog
+
+
+def _parcel(message):
+    return MessageParcel(message, "worker", None, MessageType.NOTIFICATION, None)
+
+
+def test_ack_of_old_segment_survives_rotation(tmp_path):
+    # A、C 写入 segment 0，A 的 ack 落在之后的 segment 中；
+    # segment 0 因 C 未 ack 而保留时，记录 A 的 ack 的 segment 不能被删除
+    message_log = MessageLog(str(tmp_path), segment_size=400)
+    first, second = _parcel("A" * 200), _parcel("C" * 200)
+    message_log.append(first)
+    message_log.append(second)
+    message_log.ack(first.message_context.mid)
+    for _ in range(4):
+        filler = _parcel("D" * 400)
+        message_log.append(filler)
+        message_log.ack(filler.message_context.mid)
+    message_log.close()
+
+    pending = {record["mid"] for record in MessageLog.read_pending(str(tmp_path))}
+    assert first.message_context.mid not in pending
+    assert second.message_context.mid in pending
+
+    reopened = MessageLog(str(tmp_path), segment_size=400)
+    assert second.message_context.mid in {record["mid"] for record in reopened.pending()}
+    assert first.message_context.mid not in {record["mid"] for record in reopened.pending()}
+    reopened.close()